@@ -0,0 +1,2 @@
+# 分页性能基准测试，在SQLite上生成大数据表，比较Django Paginator与HugePaginator各模式
+# 运行: python -m benchmark --help
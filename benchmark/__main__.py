@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmark',
+        description='在SQLite大数据表上比较Django Paginator与HugePaginator各模式的分页性能'
+    )
+    parser.add_argument('--rows', type=int, default=1000000, help='数据表记录数')
+    parser.add_argument('--per-page', type=int, default=30, help='每页记录数')
+    parser.add_argument('--pages', type=int, default=50, help='每个场景访问的页数')
+    parser.add_argument('--ordering', action='append', help='排序字段，可以多次指定，默认created和-score')
+    parser.add_argument('--filtered', action='store_true', help='同时测试有筛选条件的查询')
+    parser.add_argument('--paginator', action='append', help='只测试指定的分页方式，可以多次指定')
+    parser.add_argument('--pattern', action='append', help='只测试指定的访问方式: sequential, random, last')
+    parser.add_argument('--seed', type=int, default=1, help='随机数种子')
+    parser.add_argument('--vm-steps', action='store_true', help='统计SQLite虚拟机指令数')
+    parser.add_argument('--db', default='hugepagination_bench.sqlite3', help='SQLite数据库文件，记录数相同时重复使用')
+    parser.add_argument('--output', help='报告输出文件，默认输出到标准输出')
+    args = parser.parse_args(argv)
+
+    os.environ['HUGEPAGINATION_BENCH_DB'] = args.db
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmark.settings'
+    import django
+    django.setup()
+    from .runner import run, PATTERNS
+
+    report = run(
+        args.rows,
+        per_page=args.per_page,
+        pages=args.pages,
+        orderings=args.ordering or ('created', '-score'),
+        filtered=args.filtered,
+        paginators=args.paginator,
+        patterns=args.pattern or PATTERNS,
+        seed_value=args.seed,
+        vm_steps=args.vm_steps
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(text)
+    else:
+        sys.stdout.write(text + '\n')
+
+    for item in report['results']:
+        sys.stderr.write('%-10s %-8s %-14s %-10s mean %9.3fms  p95 %9.3fms  queries %5.2f  mismatched %s\n' % (
+            item['filter'], item['ordering'], item['paginator'], item['pattern'],
+            item['latency_ms']['mean'], item['latency_ms']['p95'], item['queries_per_page'], 
+            '-' if item['mismatched_pages'] is None else item['mismatched_pages']
+        ))
+    if any(item['mismatched_pages'] for item in report['results']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class Row(models.Model):
+    '''基准测试数据表
+    score取值集中在少数值上(偏斜分布)，created有大量重复值，用于测试排序值重复时的定位
+    '''
+    category = models.IntegerField(db_index=True)
+    score = models.IntegerField(db_index=True)
+    created = models.DateTimeField(db_index=True)
+    name = models.CharField(max_length=40)
+
+    class Meta:
+        app_label = 'benchmark'
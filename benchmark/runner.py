@@ -0,0 +1,284 @@
+import datetime
+import platform
+import random
+import sqlite3
+import statistics
+import time
+import django
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+import hugepagination
+from hugepagination.cache import LocalAnchorCache
+from hugepagination.count import COUNT_ESTIMATE
+from hugepagination.pagination import HugePaginator, FETCH_SUBQUERY, get_pagination_ordering
+from .models import Row
+
+# 访问方式
+# 从第1页开始依次翻页
+PATTERN_SEQUENTIAL = 'sequential'
+# 随机跳页
+PATTERN_RANDOM = 'random'
+# 反复访问最后一页
+PATTERN_LAST = 'last'
+PATTERNS = (PATTERN_SEQUENTIAL, PATTERN_RANDOM, PATTERN_LAST)
+
+
+def seed(rows, seed=1, chunk=50000):
+    '''重建数据表并写入rows条记录，已有相同数量记录时不重建
+    '''
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+    table = Row._meta.db_table
+    if table in tables and Row.objects.count() == rows:
+        return False
+    with connection.schema_editor() as editor:
+        if table in tables:
+            editor.delete_model(Row)
+        editor.create_model(Row)
+
+    rnd = random.Random(seed)
+    base = datetime.datetime(2020, 1, 1)
+    # score按幂律分布集中在少数值上，created以分钟为单位产生大量重复值
+    sql = 'INSERT INTO %s (category, score, created, name) VALUES (%%s, %%s, %%s, %%s)' % table
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for start in range(0, rows, chunk):
+                cursor.executemany(sql, [
+                    (
+                        rnd.randrange(10),
+                        int(rnd.paretovariate(1.2)) % 1000,
+                        base + datetime.timedelta(minutes=rnd.randrange(max(1, rows // 20))),
+                        'row%d' % (start + i)
+                    )
+                    for i in range(min(chunk, rows - start))
+                ])
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return True
+
+
+class Client():
+    '''模拟一个客户端，按HugePagination的方式在请求之间传递查询ID
+    @verify  是否与Django Paginator的结果比较，Django Paginator本身按原排序方式分页，重复值之间的顺序不确定，不比较
+    '''
+    def __init__(self, name, factory, verify=True):
+        self.name = name
+        self.factory = factory
+        self.verify = verify
+        self.query_id = None
+
+    def get(self, queryset, per_page, number):
+        paginator = self.factory(queryset, per_page, self.query_id)
+        if number == -1:
+            number = paginator.num_pages
+        page = paginator.page(number)
+        rows = list(page.object_list)
+        # 分页响应总是包含记录总数和页数
+        self.count = paginator.count
+        self.num_pages = paginator.num_pages
+        self.query_id = getattr(page, 'query_id', None)
+        return rows
+
+
+class CountlessClient(Client):
+    '''模拟不计算记录总数的页码分页客户端，不能直接访问最后一页
+    '''
+    def get(self, queryset, per_page, number):
+        paginator = self.factory(queryset, per_page, self.query_id)
+        page = paginator.page_countless(number)
+        rows = list(page.object_list)
+        self.query_id = page.query_id
+        return rows
+
+
+class KeysetClient():
+    '''模拟键集分页客户端，以上一页最后一条记录的排序键值作为游标
+    最后一页为最后per_page条记录
+    '''
+    name = 'keyset'
+    verify = True
+    # 最后一页是否总是满页
+    full_last_page = True
+
+    def __init__(self):
+        self.cursor = None
+
+    def get(self, queryset, per_page, number):
+        paginator = HugePaginator(queryset, per_page)
+        if number == -1:
+            rows = paginator.seek(None, True, per_page)
+        else:
+            rows = paginator.seek(self.cursor, False, per_page)
+            self.cursor = paginator.get_record_key(rows[-1]) if rows else None
+        return rows
+
+
+def get_clients():
+    '''返回参与比较的分页方式，{名称: 创建客户端的函数}
+    '''
+    return {
+        'django': lambda: Client('django', lambda qs, n, qid: Paginator(qs, n), verify=False),
+        'huge': lambda: Client('huge', lambda qs, n, qid: HugePaginator(qs, n, query_id=qid)),
+        'huge_subquery': lambda: Client(
+            'huge_subquery', lambda qs, n, qid: HugePaginator(qs, n, query_id=qid, fetch_mode=FETCH_SUBQUERY)
+        ),
+        'huge_cache': lambda: _shared_cache_client(),
+        'huge_prefetch': lambda: _prefetch_client(),
+        'huge_estimate': lambda: Client(
+            'huge_estimate', lambda qs, n, qid: HugePaginator(qs, n, query_id=qid, count_strategy=COUNT_ESTIMATE)
+        ),
+        'countless': lambda: CountlessClient('countless', lambda qs, n, qid: HugePaginator(qs, n, query_id=qid)),
+        'keyset': lambda: KeysetClient(),
+    }
+
+
+def _shared_cache_client():
+    cache = LocalAnchorCache()
+    return Client('huge_cache', lambda qs, n, qid: HugePaginator(qs, n, query_id=qid, anchor_cache=cache))
+
+
+def _prefetch_client():
+    cache = LocalAnchorCache(timeout=30)
+    return Client('huge_prefetch', lambda qs, n, qid: HugePaginator(
+        qs, n, query_id=qid, prefetch_pages=1, prefetch_cache=cache
+    ))
+
+
+def get_numbers(pattern, pages, num_pages, rnd):
+    '''返回访问的页码列表，-1表示最后一页
+    '''
+    if pattern == PATTERN_SEQUENTIAL:
+        return list(range(1, min(pages, num_pages) + 1))
+    if pattern == PATTERN_RANDOM:
+        return [rnd.randint(1, num_pages) for i in range(pages)]
+    return [-1] * pages
+
+
+class VMStepCounter():
+    '''统计SQLite虚拟机指令数，SQLite不提供扫描行数，以指令数衡量查询工作量
+    '''
+    def __init__(self, granularity=1000):
+        self.granularity = granularity
+        self.steps = 0
+
+    def _handler(self):
+        self.steps += self.granularity
+        return 0
+
+    def __enter__(self):
+        connection.ensure_connection()
+        connection.connection.set_progress_handler(self._handler, self.granularity)
+        return self
+
+    def __exit__(self, *args):
+        connection.connection.set_progress_handler(None, self.granularity)
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def get_reference(queryset, per_page):
+    '''返回作为正确结果的Django Paginator，排序方式与HugePaginator相同(以主键结尾)
+    '''
+    keys, a_order, b_order, annotations = get_pagination_ordering(queryset)
+    return Paginator(queryset.annotate(**annotations).order_by(*a_order), per_page)
+
+
+def get_expected(reference, client, number):
+    '''返回Django Paginator在相同页码得到的记录主键列表
+    '''
+    if number != -1:
+        return [row.pk for row in reference.page(number).object_list]
+    if getattr(client, 'full_last_page', False):
+        return [row.pk for row in reference.object_list[max(0, reference.count - reference.per_page):]]
+    return [row.pk for row in reference.page(reference.num_pages).object_list]
+
+
+def run_scenario(factory, queryset, per_page, pattern, pages, seed_value=1, vm_steps=False):
+    '''以新的客户端按指定访问方式取得pages个页，返回统计结果
+    HugePaginator的每一页都与Django Paginator的结果比较，记录不一致的页数
+    '''
+    reference = get_reference(queryset, per_page)
+    numbers = get_numbers(pattern, pages, reference.num_pages, random.Random(seed_value))
+    client = factory()
+    latencies = []
+    queries = []
+    mismatched = 0
+    for number in numbers:
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            rows = client.get(queryset, per_page, number)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(ctx.captured_queries))
+        if client.verify and [row.pk for row in rows] != get_expected(reference, client, number):
+            mismatched += 1
+
+    result = {
+        'paginator': client.name,
+        'pattern': pattern,
+        'pages': len(numbers),
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies), 3),
+            'p50': round(_percentile(latencies, 50), 3),
+            'p95': round(_percentile(latencies, 95), 3),
+            'max': round(max(latencies), 3),
+        },
+        'queries_per_page': round(statistics.mean(queries), 3),
+        'mismatched_pages': mismatched if client.verify else None,
+    }
+    if vm_steps:
+        # 另行执行一遍统计虚拟机指令数，避免进度回调影响延迟测量
+        client = factory()
+        with VMStepCounter() as counter:
+            for number in numbers:
+                client.get(queryset, per_page, number)
+        result['vm_steps_per_page'] = counter.steps // max(1, len(numbers))
+    return result
+
+
+def run(rows, per_page=30, pages=50, orderings=('created', '-score'), filtered=False,
+        paginators=None, patterns=PATTERNS, seed_value=1, vm_steps=False):
+    '''执行全部基准测试，返回可以序列化为JSON的报告
+    '''
+    started = time.time()
+    seed(rows, seed_value)
+    clients = get_clients()
+    if paginators:
+        clients = dict((name, clients[name]) for name in paginators)
+
+    querysets = []
+    for ordering in orderings:
+        querysets.append(('all', ordering, Row.objects.order_by(ordering)))
+        if filtered:
+            querysets.append(('category<5', ordering, Row.objects.filter(category__lt=5).order_by(ordering)))
+
+    results = []
+    for filter_name, ordering, queryset in querysets:
+        for name, factory in clients.items():
+            for pattern in patterns:
+                if name == 'keyset' and pattern == PATTERN_RANDOM:
+                    # 键集分页不支持跳页
+                    continue
+                if name == 'countless' and pattern == PATTERN_LAST:
+                    # 不计算记录总数时不能直接访问最后一页
+                    continue
+                result = run_scenario(factory, queryset, per_page, pattern, pages, seed_value, vm_steps)
+                result['filter'] = filter_name
+                result['ordering'] = ordering
+                results.append(result)
+
+    return {
+        'hugepagination': hugepagination.VERSION,
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'rows': rows,
+        'per_page': per_page,
+        'pages': pages,
+        'seed': seed_value,
+        'elapsed_s': round(time.time() - started, 3),
+        'results': results,
+    }
@@ -0,0 +1,13 @@
+# 基准测试项目配置
+import os
+
+SECRET_KEY = 'hugepagination-benchmark'
+INSTALLED_APPS = ['benchmark']
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('HUGEPAGINATION_BENCH_DB', 'hugepagination_bench.sqlite3'),
+    }
+}
+USE_TZ = False
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
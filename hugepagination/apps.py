@@ -0,0 +1,6 @@
+from django.apps import AppConfig
+
+
+class HugepaginationConfig(AppConfig):
+    name = 'hugepagination'
+    default_auto_field = 'django.db.models.AutoField'
@@ -0,0 +1,318 @@
+from functools import partial
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Max, Min
+from django.db.models.signals import pre_save, post_save, post_delete
+from . import codec
+from .count import is_unfiltered
+from .pagination import get_pagination_ordering, get_seek_condition
+
+# 早期版本页边界排序键值编码使用的签名盐值
+SALT = 'hugepagination.boundary'
+
+# 已登记的页边界索引，{登记键: Registration}
+_registry = {}
+# {模型: [Registration, ...]}
+_model_registry = {}
+
+
+def get_boundary_key(model, keys):
+    '''返回(模型, 排序键列表)的登记键
+    不允许空值的排序键没有空值排序位置，按数据库默认位置生成，与早期版本建立的索引登记键一致
+    '''
+    nulls_largest = connections[router.db_for_read(model)].features.nulls_order_largest
+    items = []
+    for name, asc, nulls_last in keys:
+        if nulls_last is None:
+            nulls_last = name != 'pk' and nulls_largest == asc
+        items.append('%s%s%s' % ('' if asc else '-', name, '~' if nulls_last else ''))
+    return '%s:%s' % (model._meta.label_lower, ','.join(items))
+
+
+def compare_values(keys, a, b):
+    '''按排序键比较两组排序键值，a在b之前返回-1，相同返回0，之后返回1
+    '''
+    for (name, asc, nulls_last), x, y in zip(keys, a, b):
+        if x == y:
+            continue
+        if x is None:
+            return 1 if nulls_last else -1
+        if y is None:
+            return -1 if nulls_last else 1
+        return (1 if x > y else -1) * (1 if asc else -1)
+    return 0
+
+
+class Registration():
+    '''(模型, 排序方式)的页边界索引登记
+    @model  模型类
+    @ordering  排序方式，与`QuerySet.order_by()`参数相同
+    @interval  相邻页边界间隔的记录数
+    '''
+    def __init__(self, model, ordering, interval=1000):
+        self.model = model
+        self.ordering = tuple(ordering)
+        self.interval = interval
+        self.keys, self.a_order, b_order, annotations = get_pagination_ordering(
+            model._default_manager.order_by(*self.ordering))
+        if annotations:
+            raise ValueError('Page boundary ordering must consist of model fields.')
+        meta = model._meta
+        self.attnames = []
+        for name, asc, nulls_last in self.keys:
+            if name == 'pk':
+                self.attnames.append(meta.pk.attname)
+                continue
+            try:
+                field = meta.get_field(name)
+            except FieldDoesNotExist:
+                raise ValueError('Page boundary ordering must consist of model fields.')
+            if not field.concrete or field.many_to_many or field.one_to_many:
+                raise ValueError('Page boundary ordering must consist of model fields.')
+            self.attnames.append(field.attname)
+        self.names = [key[0] for key in self.keys]
+        self.key = get_boundary_key(model, self.keys)
+        # 进程内缓存的(页边界数量, 最小主键, 最大主键, [(主键, 排序键值列表)])，见_get_values
+        self._values = None
+
+    def get_queryset(self):
+        '''返回按分页排序方式(以主键结尾)排序的全表查询
+        '''
+        return self.model._default_manager.order_by(*self.a_order)
+
+    def get_boundaries(self):
+        from .models import PageBoundary
+        return PageBoundary.objects.filter(key=self.key)
+
+    def get_record_values(self, pk):
+        '''从数据库读取记录的排序键值，记录不存在时返回None
+        '''
+        values = self.model._default_manager.filter(pk=pk).values_list(*self.names).first()
+        return list(values) if values is not None else None
+
+    def _seek(self, values, offset):
+        '''返回从values(包含)开始第offset条记录的排序键值，没有时返回None
+        '''
+        qset = self.get_queryset().values_list(*self.names)
+        if values is not None:
+            qset = qset.filter(get_seek_condition(self.keys, values, True))
+        rows = list(qset[offset:offset + 1])
+        return list(rows[0]) if rows else None
+
+    def rebuild(self):
+        '''重建页边界索引，返回页边界数量
+        逐段定位每隔interval条记录的排序键值，全部取得后在一个事务中替换旧的页边界
+        '''
+        from .models import PageBoundary
+        items = []
+        values = None
+        offset = 0
+        while True:
+            values = self._seek(values, self.interval)
+            if values is None:
+                break
+            offset += self.interval
+            items.append(PageBoundary(key=self.key, offset=offset, values=codec.pack(values)))
+        with transaction.atomic():
+            self.get_boundaries().delete()
+            PageBoundary.objects.bulk_create(items, batch_size=1000)
+        return len(items)
+
+    def _get_values(self):
+        '''返回按排序顺序排列的页边界[(主键, 排序键值列表)]
+        页边界按排序顺序建立(重建时按顺序批量插入，追加时插入在末尾)，主键顺序与排序顺序一致，维护时只改变偏移量，
+        排序键值在进程内缓存，每次只以一次聚合查询检查页边界是否重建或追加
+        '''
+        stats = self.get_boundaries().aggregate(count=Count('id'), lo=Min('id'), hi=Max('id'))
+        current = self._values
+        if current is not None and current[:3] == (stats['count'], stats['lo'], stats['hi']):
+            return current[3]
+        qset = self.get_boundaries()
+        items = []
+        if current is not None and current[1] == stats['lo'] and current[0] < stats['count']:
+            # 只追加了页边界
+            items = list(current[3])
+            qset = qset.filter(id__gt=current[2])
+        for pk, text in qset.order_by('id').values_list('id', 'values'):
+            items.append((pk, decode_values(text)))
+        if len(items) != stats['count']:
+            # 读取期间页边界被重建
+            self._values = None
+            return self._get_values()
+        self._values = (stats['count'], stats['lo'], stats['hi'], items)
+        return items
+
+    def _find_after(self, values):
+        '''二分查找第一个排序在values之后的页边界，返回其主键，没有时返回None
+        '''
+        items = self._get_values()
+        found = None
+        lo = 0
+        hi = len(items)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pk, xvalues = items[mid]
+            if xvalues is None:
+                # 页边界无法解码，需要执行重建命令
+                return None
+            if compare_values(self.keys, xvalues, values) > 0:
+                found = pk
+                hi = mid
+            else:
+                lo = mid + 1
+        return found
+
+    def _shift(self, values, delta):
+        '''排序在values之后的页边界偏移量增加delta，返回是否有页边界移动
+        '''
+        found = self._find_after(values)
+        if found is None:
+            return False
+        self.get_boundaries().filter(id__gte=found).update(offset=F('offset') + delta)
+        return True
+
+    def _extend(self):
+        '''在最后一个页边界之后的记录达到interval条时追加页边界
+        没有页边界时不处理，由重建命令建立索引
+        '''
+        from .models import PageBoundary
+        last = self.get_boundaries().order_by('-offset', '-id').first()
+        if last is None:
+            return
+        values = load_values(last)
+        if values is None:
+            return
+        offset = last.offset
+        while True:
+            values = self._seek(values, self.interval)
+            if values is None:
+                break
+            offset += self.interval
+            PageBoundary.objects.create(key=self.key, offset=offset, values=codec.pack(values))
+
+    def insert(self, values):
+        '''新增记录后维护页边界，记录位于最后一个页边界之前时后续页边界偏移量加1，否则按需追加页边界
+        '''
+        if not self._shift(values, 1):
+            self._extend()
+
+    def remove(self, values):
+        '''删除记录后维护页边界，后续页边界偏移量减1
+        '''
+        self._shift(values, -1)
+
+    def move(self, old, new):
+        '''记录排序键值由old改为new后维护页边界
+        两个位置之后共同的页边界偏移量不变，只有两个位置之间的页边界偏移量加减1
+        '''
+        start = self._find_after(old)
+        end = self._find_after(new)
+        if start == end:
+            return
+        if end is None or (start is not None and start < end):
+            # 记录向后移动，原位置与新位置之间的页边界前移
+            first, last, delta = start, end, -1
+        else:
+            first, last, delta = end, start, 1
+        qset = self.get_boundaries().filter(id__gte=first)
+        if last is not None:
+            qset = qset.filter(id__lt=last)
+        qset.update(offset=F('offset') + delta)
+        if end is None:
+            # 记录移到最后一个页边界之后
+            self._extend()
+
+
+def decode_values(text):
+    '''解码页边界保存的排序键值列表，无法解码时返回None
+    排序键值不签名保存，更换`SECRET_KEY`后仍可解码；早期版本以签名令牌保存，`SECRET_KEY`未更换时仍可读取
+    '''
+    try:
+        return codec.unpack(text)
+    except (codec.BadToken, TypeError, ValueError):
+        pass
+    try:
+        return codec.loads(text, salt=SALT)
+    except (codec.BadToken, TypeError, ValueError):
+        return None
+
+
+def load_values(boundary):
+    '''解码页边界的排序键值列表，无法解码时返回None
+    '''
+    return decode_values(boundary.values)
+
+
+def register(model, ordering, interval=1000):
+    '''登记需要维护页边界索引的(模型, 排序方式)，通常在`AppConfig.ready()`中调用
+    登记后监听模型的保存和删除信号，在事务提交后增量维护索引；批量更新不会发送信号，需要定期执行`build_page_boundaries`命令重建
+    '''
+    registration = Registration(model, ordering, interval)
+    _registry[registration.key] = registration
+    registrations = _model_registry.setdefault(model, [])
+    registrations[:] = [item for item in registrations if item.key != registration.key]
+    registrations.append(registration)
+    uid = 'hugepagination.boundary:%s' % model._meta.label_lower
+    pre_save.connect(_on_pre_save, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(_on_post_save, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(_on_post_delete, sender=model, weak=False, dispatch_uid=uid)
+    return registration
+
+
+def get_registrations(model=None):
+    '''返回已登记的页边界索引列表
+    '''
+    if model is None:
+        return list(_registry.values())
+    return list(_model_registry.get(model, []))
+
+
+def get_page_boundary(queryset, keys, offset):
+    '''返回偏移量不超过offset的最近页边界[偏移量, 排序键值列表]
+    只有全表查询并且排序方式已登记时可以使用页边界索引，否则返回None
+    '''
+    registration = _registry.get(get_boundary_key(queryset.model, keys), None)
+    if registration is None or not is_unfiltered(queryset):
+        return None
+    item = registration.get_boundaries().filter(offset__lte=offset).order_by('-offset', '-id').first()
+    if item is None:
+        return None
+    values = load_values(item)
+    if values is None:
+        # 无法解码的页边界视为不存在
+        return None
+    return [item.offset, values]
+
+
+def _on_pre_save(sender, instance, update_fields=None, **kwargs):
+    # 修改记录前保存原排序键值，排序键值改变时按删除和新增维护页边界
+    if instance._state.adding or instance.pk is None:
+        return
+    old = {}
+    for registration in _model_registry.get(sender, []):
+        if update_fields is not None and not set(update_fields) & set(registration.names + registration.attnames):
+            continue
+        old[registration.key] = registration.get_record_values(instance.pk)
+    instance._hugepagination_boundary_values = old
+
+
+def _on_post_save(sender, instance, created, using=None, **kwargs):
+    # 在事务中只读取新的排序键值，页边界在事务提交后维护，不延长写入事务，事务回滚时不维护
+    old = getattr(instance, '_hugepagination_boundary_values', None) or {}
+    instance._hugepagination_boundary_values = None
+    for registration in _model_registry.get(sender, []):
+        if not created and old.get(registration.key, None) is None:
+            continue
+        values = registration.get_record_values(instance.pk)
+        if values is None:
+            continue
+        if created:
+            transaction.on_commit(partial(registration.insert, values), using=using)
+        elif old[registration.key] != values:
+            transaction.on_commit(partial(registration.move, old[registration.key], values), using=using)
+
+
+def _on_post_delete(sender, instance, using=None, **kwargs):
+    for registration in _model_registry.get(sender, []):
+        values = [getattr(instance, attname) for attname in registration.attnames]
+        transaction.on_commit(partial(registration.remove, values), using=using)
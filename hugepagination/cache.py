@@ -0,0 +1,443 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.apps import apps
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import OrderBy
+from django.db.models.signals import post_save, post_delete
+
+
+def get_filter_fingerprint(queryset):
+    '''返回去掉排序后的QuerySet对象指纹，由编译后的SQL语句和参数计算，相同筛选条件的不同排序方式指纹相同
+    '''
+    queryset = queryset.order_by()
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    return hashlib.sha1(repr((queryset.db, sql, params)).encode()).hexdigest()
+
+
+def _ordering_repr(item):
+    if isinstance(item, OrderBy):
+        # OrderBy的字符串形式不包括空值排序位置
+        return (repr(item.expression), item.descending, item.nulls_first, item.nulls_last)
+    return str(item)
+
+
+def get_queryset_fingerprint(queryset, filter_fingerprint=None):
+    '''返回QuerySet对象的指纹，由去掉排序后的指纹和排序方式计算
+    @filter_fingerprint  已经计算的get_filter_fingerprint()结果，不必再次编译查询
+    '''
+    if filter_fingerprint is None:
+        filter_fingerprint = get_filter_fingerprint(queryset)
+    ordering = queryset.query.extra_order_by or queryset.query.order_by or queryset.query.get_meta().ordering
+    text = repr((filter_fingerprint, tuple(_ordering_repr(o) for o in ordering)))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+# {数据表名: 模型}
+_table_models = {}
+
+def get_query_models(queryset):
+    '''返回查询涉及的模型集合，包括筛选条件关联的模型
+    '''
+    if not _table_models:
+        for model in apps.get_models():
+            _table_models[model._meta.db_table] = model
+    models = {queryset.model}
+    for join in queryset.query.alias_map.values():
+        model = _table_models.get(join.table_name, None)
+        if model is not None:
+            models.add(model)
+    # 按关联字段排序时，排序键值来自关联模型
+    for item in queryset.query.order_by or queryset.query.get_meta().ordering:
+        if not isinstance(item, str):
+            continue
+        model = queryset.model
+        for name in item.lstrip('-+').split('__')[:-1]:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                break
+            if field.related_model is None:
+                break
+            model = field.related_model
+            models.add(model)
+    return models
+
+
+class BaseAnchorCache():
+    '''参考记录共享缓存基类
+    缓存条目以QuerySet指纹为键，保存记录总数和参考记录列表，所有客户端共享
+    读取缓存的命中和未命中次数分别记录在hits和misses属性中
+    @timeout  缓存条目有效期(秒)
+    @max_anchors  每个条目保存的参考记录最大数量
+    @prefix  缓存键前缀
+    '''
+    # 缓存是否在多个进程之间共享，只有共享缓存默认用于记录模型版本号
+    shared = False
+
+    def __init__(self, timeout=300, max_anchors=1000, prefix='hugepagination'):
+        self.timeout = timeout
+        self.max_anchors = max_anchors
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._watched = set()
+
+    def _get(self, key):
+        raise NotImplementedError('`_get()` must be implemented.')
+
+    def _set(self, key, value, timeout):
+        raise NotImplementedError('`_set()` must be implemented.')
+
+    def _version_key(self, model):
+        return '%s:version:%s' % (self.prefix, model._meta.label_lower)
+
+    def get_version(self, model):
+        '''返回模型的缓存版本号，模型数据改变后版本号增加
+        '''
+        return self._get(self._version_key(model)) or 0
+
+    def invalidate(self, model):
+        '''使模型相关的缓存条目全部失效
+        '''
+        self._set(self._version_key(model), self.get_version(model) + 1, None)
+
+    def watch(self, model):
+        '''监听模型的保存和删除信号，数据改变时使缓存失效
+        批量更新(`QuerySet.update`, `bulk_create`)不会发送信号，只能依靠有效期过期
+        '''
+        label = model._meta.label_lower
+        if label in self._watched:
+            return
+        self._watched.add(label)
+        uid = '%s:%s:%s' % (self.prefix, id(self), label)
+        post_save.connect(self._on_change, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(self._on_change, sender=model, weak=False, dispatch_uid=uid)
+
+    def _on_change(self, sender, **kwargs):
+        self.invalidate(sender)
+
+    def get_versions(self, queryset):
+        '''返回查询涉及的全部模型(包括筛选条件和排序关联的模型)的版本号，任一模型数据改变后改变
+        '''
+        versions = []
+        for model in sorted(get_query_models(queryset), key=lambda item: item._meta.label_lower):
+            self.watch(model)
+            versions.append('%s:%s' % (model._meta.label_lower, self.get_version(model)))
+        return ','.join(versions)
+
+    def make_key(self, queryset, fingerprint=None):
+        '''返回QuerySet对象的缓存键
+        @fingerprint  已经计算的QuerySet指纹，见get_queryset_fingerprint
+        '''
+        text = '%s|%s' % (self.get_versions(queryset), fingerprint or get_queryset_fingerprint(queryset))
+        return '%s:%s' % (self.prefix, hashlib.sha1(text.encode()).hexdigest())
+
+    def get(self, key):
+        '''读取缓存条目，返回字典{'count': 记录总数, 'anchors': 参考记录列表}或None
+        '''
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def has(self, key):
+        '''返回缓存条目是否存在，不计入命中和未命中次数
+        '''
+        return self._get(key) is not None
+
+    def set(self, key, entry):
+        '''写入缓存条目
+        '''
+        self._set(key, entry, self.timeout)
+
+
+class LocalAnchorCache(BaseAnchorCache):
+    '''进程内LRU参考记录缓存
+    @max_entries  缓存条目最大数量
+    '''
+    def __init__(self, max_entries=1000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        # 模型版本号不参与LRU淘汰，淘汰后版本号回到0可能与旧的查询ID一致
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get_version(self, model):
+        return self._versions.get(model._meta.label_lower, 0)
+
+    def invalidate(self, model):
+        with self._lock:
+            label = model._meta.label_lower
+            self._versions[label] = self._versions.get(label, 0) + 1
+
+    def _get(self, key):
+        with self._lock:
+            item = self._data.get(key, None)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def _set(self, key, value, timeout):
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class DjangoAnchorCache(BaseAnchorCache):
+    '''使用Django缓存框架的参考记录缓存，可以在多个进程之间共享
+    @alias  Django缓存配置名称
+    '''
+    shared = True
+
+    def __init__(self, alias='default', **kwargs):
+        super().__init__(**kwargs)
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _get(self, key):
+        return self.cache.get(key)
+
+    def _set(self, key, value, timeout):
+        self.cache.set(key, value, timeout)
+
+    def invalidate(self, model):
+        key = self._version_key(model)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, None)
+
+
+default_anchor_cache = LocalAnchorCache()
+_django_anchor_caches = {}
+
+# 预取页缓存，保存相邻页的记录主键，有效期较短
+default_prefetch_cache = LocalAnchorCache(timeout=30, prefix='hugepagination:prefetch')
+_django_prefetch_caches = {}
+
+
+def get_anchor_cache(value):
+    '''根据配置返回参考记录缓存实例
+    @value  None或False不使用缓存，True使用进程内缓存，字符串为Django缓存配置名称，也可以直接传入缓存实例
+    '''
+    if not value:
+        return None
+    if value is True:
+        return default_anchor_cache
+    if isinstance(value, str):
+        if value not in _django_anchor_caches:
+            _django_anchor_caches[value] = DjangoAnchorCache(value)
+        return _django_anchor_caches[value]
+    return value
+
+
+def get_prefetch_cache(value):
+    '''根据配置返回预取页缓存实例
+    @value  None或False不使用缓存，True使用进程内缓存，字符串为Django缓存配置名称，也可以直接传入缓存实例
+    '''
+    if not value:
+        return None
+    if value is True:
+        return default_prefetch_cache
+    if isinstance(value, str):
+        if value not in _django_prefetch_caches:
+            _django_prefetch_caches[value] = DjangoAnchorCache(value, timeout=30, prefix='hugepagination:prefetch')
+        return _django_prefetch_caches[value]
+    return value
+
+
+class BackgroundTasks():
+    '''在后台线程执行任务，同一键同时只有一个线程，启动的线程数记录在started属性中
+    '''
+    def __init__(self):
+        self.started = 0
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def start(self, key, func):
+        '''在后台线程执行func，同一键已有线程在执行时不再启动，返回是否启动了线程
+        '''
+        with self._lock:
+            if key in self._running:
+                return False
+            self._running.add(key)
+            self.started += 1
+
+        def run():
+            try:
+                func()
+            finally:
+                with self._lock:
+                    self._running.discard(key)
+                # 后台线程的数据库连接不会随请求结束关闭
+                connections.close_all()
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+
+class CountCache():
+    '''记录总数缓存
+    以去掉排序后的查询SQL和参数为键，不同排序方式和所有客户端共享；查询涉及的任一模型(包括筛选条件关联的模型)保存或删除后失效。
+    超过有效期timeout后的stale_timeout秒内仍返回旧值，同时在后台线程重新计数，请求不必等待计数查询
+    后台刷新次数记录在refreshes属性中
+    @storage  缓存存储，BaseAnchorCache实例，默认使用进程内缓存
+    @timeout  有效期(秒)
+    @stale_timeout  超过有效期后仍可返回旧值的时间(秒)，超过后重新计数
+    '''
+    def __init__(self, storage=None, timeout=60, stale_timeout=600):
+        self.timeout = timeout
+        self.stale_timeout = stale_timeout
+        self.storage = storage or LocalAnchorCache(timeout=timeout + stale_timeout, prefix='hugepagination:count')
+        self._tasks = BackgroundTasks()
+
+    @property
+    def refreshes(self):
+        return self._tasks.started
+
+    def make_key(self, queryset, fingerprint=None):
+        '''返回QuerySet对象的记录总数缓存键
+        @fingerprint  已经计算的去掉排序后的指纹，见get_filter_fingerprint
+        '''
+        queryset = queryset.order_by()
+        text = '%s|%s' % (self.storage.get_versions(queryset), fingerprint or get_filter_fingerprint(queryset))
+        return '%s:%s' % (self.storage.prefix, hashlib.sha1(text.encode()).hexdigest())
+
+    def get_count(self, queryset, compute, fingerprint=None):
+        '''返回(记录总数, 是否估算值, 是否来自缓存)
+        @compute  计算记录总数的函数，返回(记录总数, 是否估算值)
+        @fingerprint  同make_key
+        '''
+        key = self.make_key(queryset, fingerprint)
+        entry = self.storage.get(key)
+        if entry is not None:
+            if time.time() - entry['time'] > self.timeout:
+                self._refresh(key, compute)
+            return entry['count'], entry['approximate'], True
+        count, approximate = compute()
+        self._set(key, count, approximate)
+        return count, approximate, False
+
+    def set_count(self, queryset, count, approximate=False, fingerprint=None):
+        '''更新记录总数，分页器发现记录总数偏差后调用
+        '''
+        self._set(self.make_key(queryset, fingerprint), count, approximate)
+
+    def _set(self, key, count, approximate):
+        self.storage.set(key, {'count': count, 'approximate': approximate, 'time': time.time()})
+
+    def _refresh(self, key, compute):
+        '''在后台线程重新计数，同一缓存键同时只有一个刷新线程
+        '''
+        self._tasks.start(key, lambda: self._set(key, *compute()))
+
+
+default_count_cache = CountCache()
+_django_count_caches = {}
+
+
+def get_count_cache(value):
+    '''根据配置返回记录总数缓存实例
+    @value  None或False不使用缓存，True使用进程内缓存，字符串为Django缓存配置名称，也可以直接传入缓存实例
+    '''
+    if not value:
+        return None
+    if value is True:
+        return default_count_cache
+    if isinstance(value, str):
+        if value not in _django_count_caches:
+            _django_count_caches[value] = CountCache(
+                DjangoAnchorCache(value, timeout=660, prefix='hugepagination:count')
+            )
+        return _django_count_caches[value]
+    return value
+
+
+class HistogramCache():
+    '''排序键直方图缓存，直方图见`hugepagination.histogram`
+    以QuerySet指纹(包括筛选条件和排序方式)为键，直方图在后台线程建立，请求不必等待抽样和计数查询，建立完成前不使用直方图。
+    直方图的偏移量是建立时的准确值，查询涉及的任一模型保存或删除后，或请求中精确计数的记录总数与建立时不一致时不再使用，
+    并在后台重新建立，同一缓存键同时只有一个建立线程。批量更新不发送信号，不改变记录总数的批量更新只能依靠有效期过期，
+    在此之前偏移量是近似值。后台建立次数记录在builds属性中
+    @storage  缓存存储，BaseAnchorCache实例，默认使用进程内缓存
+    @timeout  有效期(秒)
+    @buckets  直方图分段数量
+    @sample_size  抽样记录数
+    @background  是否在后台线程建立，False时在请求中建立
+    '''
+    def __init__(self, storage=None, timeout=300, buckets=100, sample_size=10000, background=True):
+        self.buckets = buckets
+        self.sample_size = sample_size
+        self.background = background
+        self.storage = storage or LocalAnchorCache(timeout=timeout, prefix='hugepagination:histogram')
+        self._tasks = BackgroundTasks()
+
+    @property
+    def builds(self):
+        return self._tasks.started
+
+    def make_key(self, queryset, fingerprint=None):
+        '''返回QuerySet对象的直方图缓存键
+        @fingerprint  已经计算的QuerySet指纹，见get_queryset_fingerprint
+        '''
+        return '%s:%s' % (self.storage.prefix, fingerprint or get_queryset_fingerprint(queryset))
+
+    def get_histogram(self, queryset, build, fingerprint=None, count=None):
+        '''返回直方图，没有缓存或已经失效时建立，后台建立时返回None
+        @build  建立直方图的函数，参数为(分段数量, 抽样记录数)
+        @fingerprint  同make_key
+        @count  请求中精确计数得到的记录总数，与直方图建立时不一致说明记录已经改变，None不检查
+        '''
+        key = self.make_key(queryset, fingerprint)
+        versions = self.storage.get_versions(queryset)
+        entry = self.storage.get(key)
+        if entry is not None and entry['versions'] == versions and count in (None, entry['count']):
+            return entry
+        if self.background:
+            self._tasks.start(key, lambda: self._set(key, versions, build))
+            return None
+        return self._set(key, versions, build)
+
+    def _set(self, key, versions, build):
+        entry = dict(build(self.buckets, self.sample_size), versions=versions)
+        self.storage.set(key, entry)
+        return entry
+
+
+default_histogram_cache = HistogramCache()
+_django_histogram_caches = {}
+
+
+def get_histogram_cache(value):
+    '''根据配置返回直方图缓存实例
+    @value  None或False不使用直方图，True使用进程内缓存，字符串为Django缓存配置名称，也可以直接传入缓存实例
+    '''
+    if not value:
+        return None
+    if value is True:
+        return default_histogram_cache
+    if isinstance(value, str):
+        if value not in _django_histogram_caches:
+            _django_histogram_caches[value] = HistogramCache(
+                DjangoAnchorCache(value, timeout=300, prefix='hugepagination:histogram')
+            )
+        return _django_histogram_caches[value]
+    return value
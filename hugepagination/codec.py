@@ -0,0 +1,264 @@
+import base64
+import datetime
+import decimal
+import hashlib
+import hmac
+import struct
+import time
+import uuid
+from django.conf import settings
+
+# 编码格式版本，格式改变时增加，旧版本令牌将被拒绝
+VERSION = 1
+# 签名长度(字节)
+MAC_SIZE = 10
+
+# 值类型标记
+T_NONE = 0
+T_FALSE = 1
+T_TRUE = 2
+T_INT = 3
+T_FLOAT = 4
+T_STR = 5
+T_DECIMAL = 6
+T_DATETIME = 7
+T_DATETIME_TZ = 8
+T_DATE = 9
+T_TIME = 10
+T_UUID = 11
+T_LIST = 12
+T_BYTES = 13
+T_TIMEDELTA = 14
+
+# 可以直接编码的值类型
+NATIVE_TYPES = (
+    type(None), bool, int, float, str, bytes, decimal.Decimal,
+    datetime.datetime, datetime.date, datetime.time, datetime.timedelta,
+    uuid.UUID, list, tuple
+)
+
+
+class BadToken(ValueError):
+    '''令牌无效、被篡改或已过期
+    '''
+    pass
+
+
+def _write_varint(buf, value):
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+def _write_zigzag(buf, value):
+    _write_varint(buf, value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise BadToken('Truncated token.')
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def _read_zigzag(data, pos):
+    value, pos = _read_varint(data, pos)
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+
+def _write_bytes(buf, value):
+    _write_varint(buf, len(value))
+    buf.extend(value)
+
+def _read_bytes(data, pos):
+    size, pos = _read_varint(data, pos)
+    if pos + size > len(data):
+        raise BadToken('Truncated token.')
+    return bytes(data[pos:pos + size]), pos + size
+
+def _time_micros(value):
+    return ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 + value.microsecond
+
+def _micros_time(micros):
+    seconds, microsecond = divmod(micros, 1000000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return datetime.time(hour, minute, second, microsecond)
+
+def encode_value(buf, value):
+    '''将值编码后写入buf，不支持的类型抛出TypeError
+    '''
+    if value is None:
+        buf.append(T_NONE)
+    elif value is True:
+        buf.append(T_TRUE)
+    elif value is False:
+        buf.append(T_FALSE)
+    elif isinstance(value, int):
+        buf.append(T_INT)
+        _write_zigzag(buf, value)
+    elif isinstance(value, float):
+        buf.append(T_FLOAT)
+        buf.extend(struct.pack('>d', value))
+    elif isinstance(value, str):
+        buf.append(T_STR)
+        _write_bytes(buf, value.encode())
+    elif isinstance(value, decimal.Decimal):
+        if not value.is_finite():
+            raise TypeError('Cannot encode non-finite decimal %r.' % value)
+        sign, digits, exponent = value.as_tuple()
+        coefficient = int(''.join(map(str, digits)) or '0')
+        buf.append(T_DECIMAL)
+        _write_zigzag(buf, -coefficient if sign else coefficient)
+        _write_zigzag(buf, exponent)
+    elif isinstance(value, datetime.datetime):
+        offset = value.utcoffset()
+        buf.append(T_DATETIME if offset is None else T_DATETIME_TZ)
+        _write_varint(buf, value.toordinal())
+        _write_varint(buf, _time_micros(value))
+        if offset is not None:
+            _write_zigzag(buf, int(offset.total_seconds()))
+    elif isinstance(value, datetime.date):
+        buf.append(T_DATE)
+        _write_varint(buf, value.toordinal())
+    elif isinstance(value, datetime.time):
+        if value.utcoffset() is not None:
+            raise TypeError('Cannot encode aware time %r.' % value)
+        buf.append(T_TIME)
+        _write_varint(buf, _time_micros(value))
+    elif isinstance(value, datetime.timedelta):
+        buf.append(T_TIMEDELTA)
+        _write_zigzag(buf, (value.days * 86400 + value.seconds) * 1000000 + value.microseconds)
+    elif isinstance(value, uuid.UUID):
+        buf.append(T_UUID)
+        buf.extend(value.bytes)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        buf.append(T_BYTES)
+        _write_bytes(buf, bytes(value))
+    elif isinstance(value, (list, tuple)):
+        buf.append(T_LIST)
+        _write_varint(buf, len(value))
+        for item in value:
+            encode_value(buf, item)
+    else:
+        raise TypeError('Cannot encode value of type %s.' % type(value).__name__)
+
+def decode_value(data, pos):
+    '''从data的pos位置解码一个值，返回(值, 新位置)
+    '''
+    if pos >= len(data):
+        raise BadToken('Truncated token.')
+    tag = data[pos]
+    pos += 1
+    if tag == T_NONE:
+        return None, pos
+    if tag == T_TRUE:
+        return True, pos
+    if tag == T_FALSE:
+        return False, pos
+    if tag == T_INT:
+        return _read_zigzag(data, pos)
+    if tag == T_FLOAT:
+        if pos + 8 > len(data):
+            raise BadToken('Truncated token.')
+        return struct.unpack('>d', data[pos:pos + 8])[0], pos + 8
+    if tag == T_STR:
+        value, pos = _read_bytes(data, pos)
+        return value.decode(), pos
+    if tag == T_DECIMAL:
+        coefficient, pos = _read_zigzag(data, pos)
+        exponent, pos = _read_zigzag(data, pos)
+        digits = tuple(map(int, str(abs(coefficient))))
+        return decimal.Decimal((int(coefficient < 0), digits, exponent)), pos
+    if tag in (T_DATETIME, T_DATETIME_TZ):
+        ordinal, pos = _read_varint(data, pos)
+        micros, pos = _read_varint(data, pos)
+        value = datetime.datetime.combine(datetime.date.fromordinal(ordinal), _micros_time(micros))
+        if tag == T_DATETIME_TZ:
+            offset, pos = _read_zigzag(data, pos)
+            value = value.replace(tzinfo=datetime.timezone(datetime.timedelta(seconds=offset)))
+        return value, pos
+    if tag == T_DATE:
+        ordinal, pos = _read_varint(data, pos)
+        return datetime.date.fromordinal(ordinal), pos
+    if tag == T_TIME:
+        micros, pos = _read_varint(data, pos)
+        return _micros_time(micros), pos
+    if tag == T_TIMEDELTA:
+        micros, pos = _read_zigzag(data, pos)
+        return datetime.timedelta(microseconds=micros), pos
+    if tag == T_UUID:
+        if pos + 16 > len(data):
+            raise BadToken('Truncated token.')
+        return uuid.UUID(bytes=bytes(data[pos:pos + 16])), pos + 16
+    if tag == T_BYTES:
+        return _read_bytes(data, pos)
+    if tag == T_LIST:
+        size, pos = _read_varint(data, pos)
+        items = []
+        for i in range(size):
+            item, pos = decode_value(data, pos)
+            items.append(item)
+        return items, pos
+    raise BadToken('Unknown value tag %d.' % tag)
+
+def _signature(salt, data):
+    key = hashlib.sha256((salt + settings.SECRET_KEY).encode()).digest()
+    return hmac.new(key, data, hashlib.sha256).digest()[:MAC_SIZE]
+
+def dumps(value, salt='hugepagination'):
+    '''将值编码为带版本号、时间戳和签名的URL安全令牌
+    '''
+    buf = bytearray([VERSION])
+    _write_varint(buf, int(time.time()))
+    encode_value(buf, value)
+    buf.extend(_signature(salt, bytes(buf)))
+    return base64.urlsafe_b64encode(bytes(buf)).rstrip(b'=').decode()
+
+def loads(token, salt='hugepagination', max_age=None):
+    '''解码令牌，令牌无效、被篡改、版本不一致或超过max_age秒时抛出BadToken
+    '''
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    except (TypeError, ValueError):
+        raise BadToken('Malformed token.')
+    if len(data) <= MAC_SIZE + 1:
+        raise BadToken('Truncated token.')
+    if data[0] != VERSION:
+        raise BadToken('Stale token version.')
+    body = data[:-MAC_SIZE]
+    if not hmac.compare_digest(_signature(salt, body), data[-MAC_SIZE:]):
+        raise BadToken('Bad token signature.')
+    timestamp, pos = _read_varint(body, 1)
+    if max_age is not None and time.time() - timestamp > max_age:
+        raise BadToken('Token expired.')
+    value, pos = decode_value(body, pos)
+    if pos != len(body):
+        raise BadToken('Trailing data in token.')
+    return value
+
+def pack(value):
+    '''将值编码为带版本号的URL安全文本，不带时间戳和签名
+    用于保存在服务端的数据，不受`SECRET_KEY`更换影响
+    '''
+    buf = bytearray([VERSION])
+    encode_value(buf, value)
+    return base64.urlsafe_b64encode(bytes(buf)).rstrip(b'=').decode()
+
+def unpack(text):
+    '''解码pack()的结果，数据无效或版本不一致时抛出BadToken
+    '''
+    try:
+        data = base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+    except (TypeError, ValueError):
+        raise BadToken('Malformed data.')
+    if not data or data[0] != VERSION:
+        raise BadToken('Stale data version.')
+    value, pos = decode_value(data, 1)
+    if pos != len(data):
+        raise BadToken('Trailing data.')
+    return value
@@ -0,0 +1,93 @@
+import json
+from django.db import connections, DatabaseError
+
+# 记录总数计算方式
+# 精确计数
+COUNT_EXACT = 'exact'
+# 估算记录数
+COUNT_ESTIMATE = 'estimate'
+# 估算记录数超过阈值时使用估算值，否则精确计数
+COUNT_HYBRID = 'hybrid'
+
+
+def is_unfiltered(queryset):
+    '''判断QuerySet对象是否为没有筛选条件的全表查询
+    '''
+    query = queryset.query
+    return (
+        not query.where
+        and not query.distinct
+        and not query.combinator
+        and query.low_mark == 0
+        and query.high_mark is None
+    )
+
+
+def get_table_estimate(queryset):
+    '''从数据库统计信息读取数据表的估算记录数，不支持的数据库或没有统计信息时返回None
+    '''
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table]
+                )
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            # ANALYZE生成的统计表，stat第一项为数据表记录数
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        # PostgreSQL未分析过的数据表reltuples为-1
+        return None
+    return int(row[0])
+
+
+def get_explain_estimate(queryset):
+    '''从查询计划读取估算记录数，不支持的数据库返回None
+    '''
+    connection = connections[queryset.db]
+    sql, params = queryset.order_by().query.get_compiler(queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [col[0].lower() for col in cursor.description]
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            row = dict(zip(columns, row))
+            # 第一行为驱动表，估算记录数为扫描行数乘以过滤比例
+            rows = row.get('rows') or 0
+            filtered = row.get('filtered')
+            if filtered is not None:
+                rows = rows * float(filtered) / 100
+            return int(rows)
+        elif connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+    return None
+
+
+def estimate_count(queryset):
+    '''返回QuerySet对象的估算记录数
+    全表查询使用数据表统计信息，有筛选条件的查询使用查询计划的估算行数，无法估算时返回None
+    '''
+    try:
+        if is_unfiltered(queryset):
+            return get_table_estimate(queryset)
+        return get_explain_estimate(queryset)
+    except DatabaseError:
+        return None
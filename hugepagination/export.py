@@ -0,0 +1,185 @@
+import csv
+import json
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.db import connections
+from rest_framework.utils.encoders import JSONEncoder
+from .pagination import HugePaginator
+
+# 导出格式
+EXPORT_NDJSON = 'ndjson'
+EXPORT_CSV = 'csv'
+
+CONTENT_TYPES = {
+    EXPORT_NDJSON: 'application/x-ndjson',
+    EXPORT_CSV: 'text/csv; charset=utf-8',
+}
+
+
+def iter_keyset_chunks(queryset, chunk_size=1000, start=None, stop=None):
+    '''按分页排序方式以键集定位逐块读取记录集，每次返回一块记录列表
+    每块以上一块最后一条记录的排序键值定位，不使用OFFSET，导出全部记录的代价与记录数成线性关系，内存占用固定
+    @start  开始记录排序键值列表(包含)，None从第一条记录开始
+    @stop  结束记录排序键值列表(不包含)，None到最后一条记录
+    '''
+    paginator = HugePaginator(queryset, chunk_size)
+    values = start
+    inclusive = start is not None
+    while True:
+        rows = paginator.seek(values, False, chunk_size, inclusive, stop)
+        inclusive = False
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        values = paginator.get_record_key(rows[-1])
+
+
+def iter_keyset(queryset, chunk_size=1000):
+    '''按分页排序方式以键集定位逐条返回记录集的全部记录
+    '''
+    for rows in iter_keyset_chunks(queryset, chunk_size):
+        for row in rows:
+            yield row
+
+
+def iter_serialized(queryset, serializer_class, context=None, chunk_size=1000):
+    '''逐块序列化记录，逐条返回序列化数据
+    '''
+    for rows in iter_keyset_chunks(queryset, chunk_size):
+        for item in serializer_class(rows, many=True, context=context).data:
+            yield item
+
+
+def iter_ndjson(items):
+    '''将序列化数据逐条编码为NDJSON行
+    '''
+    for item in items:
+        yield json.dumps(item, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+class _Echo():
+    '''csv.writer的输出对象，直接返回写入的内容
+    '''
+    def write(self, value):
+        return value
+
+
+def iter_csv(items):
+    '''将序列化数据逐条编码为CSV行，第一行为字段名，嵌套数据编码为JSON
+    '''
+    writer = csv.writer(_Echo())
+    fields = None
+    for item in items:
+        if fields is None:
+            fields = list(item.keys())
+            yield writer.writerow(fields)
+        yield writer.writerow([
+            json.dumps(value, cls=JSONEncoder, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+            for value in (item.get(field, None) for field in fields)
+        ])
+
+
+def iter_export(queryset, serializer_class, export_format=EXPORT_NDJSON, context=None, chunk_size=1000):
+    '''返回指定格式的导出内容生成器
+    '''
+    items = iter_serialized(queryset, serializer_class, context, chunk_size)
+    if export_format == EXPORT_CSV:
+        return iter_csv(items)
+    return iter_ndjson(items)
+
+
+def get_key_boundaries(queryset, range_size):
+    '''返回将记录集按分页排序方式每range_size条记录分为一段的分段边界(每段第一条记录的排序键值)，不含第一段
+    数据库支持窗口函数时一次扫描取得全部边界，否则从开始位置逐段键集定位，共扫描一遍记录集
+    '''
+    paginator = HugePaginator(queryset, range_size)
+    numbers = range(2, paginator.num_pages + 1)
+    boundaries = paginator.locate_pages(numbers)
+    if len(boundaries) == len(numbers):
+        return [values for offset, values in boundaries]
+
+    paginator._get_ordering()
+    names = [key[0] for key in paginator._ordering]
+    boundaries = []
+    values = None
+    while True:
+        qset = paginator._get_seek_queryset(values, False, inclusive=True).values_list(*names)
+        rows = list(qset[range_size:range_size + 1])
+        if not rows:
+            return boundaries
+        values = list(rows[0])
+        boundaries.append(values)
+
+
+def export_range(model, query, db, start, stop, serializer_class, export_format, context=None, chunk_size=1000):
+    '''导出[start, stop)范围内的记录，返回(CSV字段名行, 内容)，NDJSON格式字段名行为None
+    在线程池或进程池中执行，使用所在线程或进程独立的数据库连接，结束后关闭
+    QuerySet对象序列化时会执行查询，因此传入模型和Query对象，在执行时重新构造QuerySet对象
+    '''
+    queryset = model._default_manager.db_manager(db).all()
+    queryset.query = query
+    try:
+        items = []
+        for rows in iter_keyset_chunks(queryset, chunk_size, start, stop):
+            items.extend(serializer_class(rows, many=True, context=context).data)
+        if export_format == EXPORT_CSV:
+            lines = list(iter_csv(items))
+            return (lines[0] if lines else None), ''.join(lines[1:])
+        return None, ''.join(iter_ndjson(items))
+    finally:
+        connections.close_all()
+
+
+def iter_parallel_export(
+    queryset, 
+    serializer_class, 
+    export_format=EXPORT_NDJSON, 
+    context=None, 
+    workers=4, 
+    range_size=10000, 
+    chunk_size=1000, 
+    processes=False
+    ):
+    '''并行导出，按分页排序方式将记录集分为每段range_size条记录，在线程池或进程池中并行读取和序列化，按顺序合并输出
+    同时处理的分段不超过workers的2倍，内存占用与range_size成正比
+    @workers  并行数量
+    @processes  True使用进程池，序列化不受GIL限制；子进程不能使用序列化器上下文(context)，
+                需要支持fork启动方式，并且不能在数据库事务中调用
+    '''
+    boundaries = get_key_boundaries(queryset, range_size)
+    ranges = iter(list(zip([None] + boundaries, boundaries + [None])))
+    if processes:
+        # 子进程不能共用父进程的数据库连接，创建进程前关闭
+        connections.close_all()
+        context = None
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    else:
+        executor = ThreadPoolExecutor(workers)
+
+    def submit():
+        item = next(ranges, None)
+        if item is not None:
+            pending.append(executor.submit(
+                export_range, queryset.model, queryset.query, queryset.db, item[0], item[1], 
+                serializer_class, export_format, context, chunk_size
+            ))
+
+    pending = deque()
+    header_sent = False
+    try:
+        for i in range(workers * 2):
+            submit()
+        while pending:
+            header, body = pending.popleft().result()
+            submit()
+            if header and not header_sent:
+                header_sent = True
+                yield header
+            if body:
+                yield body
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,62 @@
+import random
+from bisect import bisect_right
+from django.db.models import Count, Max, Min, Q
+from .pagination import get_seek_condition
+
+
+def sample_keys(queryset, keys, a_order, count, sample_size=10000, strata=100):
+    '''按主键区间分层抽样，返回按分页排序方式排列的样本排序键值列表
+    主键取值范围等分为strata段，每段随机选取一个区间，区间宽度使样本约为sample_size条；
+    抽样查询是主键索引范围扫描，不对全部记录排序，只有样本由数据库排序。主键不是整数时返回空列表
+    @queryset  QuerySet对象，排序表达式已经以注解加入查询
+    @keys  排序键列表，见`get_pagination_ordering`
+    @a_order  正向排序列表
+    @count  记录总数，可以是估算值，用于估计区间宽度
+    '''
+    names = [key[0] for key in keys]
+    qset = queryset.order_by()
+    limits = qset.aggregate(lo=Min('pk'), hi=Max('pk'))
+    lo, hi = limits['lo'], limits['hi']
+    if not isinstance(lo, int) or not isinstance(hi, int) or not count:
+        return []
+    span = hi - lo + 1
+    strata = max(1, min(strata, span))
+    width = max(1, int(span * min(1, sample_size / count) / strata))
+    cond = Q()
+    for i in range(strata):
+        start = lo + span * i // strata
+        end = lo + span * (i + 1) // strata
+        xwidth = min(width, end - start)
+        begin = random.randint(start, end - xwidth)
+        cond |= Q(pk__gte=begin, pk__lt=begin + xwidth)
+    return [list(row) for row in qset.filter(cond).order_by(*a_order).values_list(*names)]
+
+
+def build_histogram(queryset, keys, a_order, count, buckets=100, sample_size=10000):
+    '''抽样建立排序键的等深直方图，返回{'count': 记录总数, 'bounds': 边界列表}
+    边界为[偏移量, 排序键值列表]，按分页排序方式排列。
+    从样本中等间隔选取排序键值作为边界，再以一次不排序的条件计数查询同时得到全部边界的准确偏移量。
+    计数查询扫描全部记录，应在请求之外执行，见`HistogramCache`
+    @count  记录总数，可以是估算值，见sample_keys
+    '''
+    rows = sample_keys(queryset, keys, a_order, count, sample_size, buckets)
+    if not rows:
+        return {'count': count, 'bounds': []}
+    step = max(1, len(rows) // buckets)
+    values = [rows[rank] for rank in range(step, len(rows), step)]
+    counts = {'count': Count('pk')}
+    for i, xvalues in enumerate(values):
+        counts['bound_%d' % i] = Count('pk', filter=get_seek_condition(keys, xvalues, False))
+    result = queryset.order_by().aggregate(**counts)
+    bounds = [[result['bound_%d' % i], xvalues] for i, xvalues in enumerate(values)]
+    return {'count': result['count'], 'bounds': bounds}
+
+
+def find_bound(histogram, offset):
+    '''返回偏移量不超过offset的最近边界[偏移量, 排序键值列表]，没有时返回None
+    '''
+    bounds = histogram['bounds']
+    i = bisect_right([bound[0] for bound in bounds], offset)
+    if i == 0:
+        return None
+    return [bounds[i - 1][0], bounds[i - 1][1]]
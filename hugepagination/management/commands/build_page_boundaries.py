@@ -0,0 +1,35 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from hugepagination.boundary import get_registrations, register
+
+
+class Command(BaseCommand):
+    help = '重建页边界索引，不指定模型时重建全部已登记的(模型, 排序方式)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', nargs='?', help='模型标签，格式为app_label.ModelName')
+        parser.add_argument('--ordering', help='排序方式，逗号分隔，例如 -created,-id；未登记时按此登记')
+        parser.add_argument('--interval', type=int, default=1000, help='相邻页边界间隔的记录数')
+
+    def handle(self, *args, **options):
+        if options['model']:
+            try:
+                model = apps.get_model(options['model'])
+            except (LookupError, ValueError) as exc:
+                raise CommandError(str(exc))
+            registrations = get_registrations(model)
+            if options['ordering']:
+                ordering = [item.strip() for item in options['ordering'].split(',') if item.strip()]
+                try:
+                    registration = register(model, ordering, options['interval'])
+                except ValueError as exc:
+                    raise CommandError(str(exc))
+                registrations = [registration]
+            if not registrations:
+                raise CommandError('%s has no registered page boundary ordering, use --ordering.' % options['model'])
+        else:
+            registrations = get_registrations()
+
+        for registration in registrations:
+            count = registration.rebuild()
+            self.stdout.write('%s: %d boundaries' % (registration.key, count))
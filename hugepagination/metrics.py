@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import defaultdict
+from .signals import page_served
+
+try:
+    from prometheus_client.core import CounterMetricFamily, HistogramMetricFamily
+except ImportError:
+    CounterMetricFamily = None
+    HistogramMetricFamily = None
+
+
+class QueryStats():
+    '''统计代码块中数据库连接执行的查询次数和耗时，可以同时统计多个数据库连接
+    ```
+    with QueryStats(connection) as qs:
+        ...
+    qs.queries, qs.db_time
+    ```
+    '''
+    def __init__(self, *connections):
+        self.connections = []
+        for connection in connections:
+            if connection not in self.connections:
+                self.connections.append(connection)
+        self.queries = 0
+        self.db_time = 0.0
+        self._wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def __enter__(self):
+        for connection in self.connections:
+            wrapper = connection.execute_wrapper(self)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, *args):
+        while self._wrappers:
+            self._wrappers.pop().__exit__(*args)
+
+
+def format_stats(stats):
+    '''将执行情况格式化为一行文本，用于调试响应头
+    '''
+    items = []
+    for key, value in stats.items():
+        if value is None:
+            continue
+        if key == 'db_time':
+            value = '%.3fms' % (value * 1000)
+        items.append('%s=%s' % (key, value))
+    return '; '.join(items)
+
+
+class PrometheusCollector():
+    '''汇总page_served信号的Prometheus风格指标收集器
+    render()返回Prometheus文本格式；安装了prometheus_client时可以注册到REGISTRY：
+    ```
+    collector = PrometheusCollector().connect()
+    prometheus_client.REGISTRY.register(collector)
+    ```
+    @prefix  指标名前缀
+    @buckets  跳过记录数直方图的分桶上限
+    @time_buckets  数据库耗时(秒)直方图的分桶上限
+    '''
+    def __init__(
+        self,
+        prefix='hugepagination',
+        buckets=(0, 100, 1000, 10000, 100000, 1000000),
+        time_buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+        ):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self.time_buckets = tuple(time_buckets)
+        self._lock = threading.Lock()
+        self._pages = defaultdict(int)
+        self._query_ids = defaultdict(int)
+        self._offsets = [0] * (len(self.buckets) + 1)
+        self._offset_sum = 0
+        self._db_times = [0] * (len(self.time_buckets) + 1)
+        self._db_time_sum = 0.0
+        self._queries = 0
+
+    def connect(self):
+        '''连接page_served信号，返回收集器本身
+        '''
+        page_served.connect(self.observe, weak=False, dispatch_uid='%s:%s' % (self.prefix, id(self)))
+        return self
+
+    def disconnect(self):
+        page_served.disconnect(dispatch_uid='%s:%s' % (self.prefix, id(self)))
+
+    def _observe_histogram(self, counts, buckets, value):
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                counts[i] += 1
+                return
+        counts[-1] += 1
+
+    def observe(self, sender=None, stats=None, **kwargs):
+        with self._lock:
+            self._pages[tuple(_format_label(stats[key]) for key in ('branch', 'count_source', 'anchor'))] += 1
+            self._query_ids[stats['query_id']] += 1
+            if stats['offset'] is not None:
+                self._observe_histogram(self._offsets, self.buckets, stats['offset'])
+                self._offset_sum += stats['offset']
+            if stats.get('db_time', None) is not None:
+                self._observe_histogram(self._db_times, self.time_buckets, stats['db_time'])
+                self._db_time_sum += stats['db_time']
+                self._queries += stats['queries']
+
+    def _histogram(self, counts, buckets):
+        total = 0
+        result = []
+        for bound, count in zip(buckets + (float('inf'),), counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def samples(self):
+        '''返回指标样本列表，元素为(指标名, 标签字典, 值)
+        '''
+        name = self.prefix
+        items = []
+        with self._lock:
+            for (branch, count_source, anchor), value in sorted(self._pages.items()):
+                items.append((name + '_pages_total', {'branch': branch, 'count_source': count_source, 'anchor': anchor}, value))
+            for status, value in sorted(self._query_ids.items()):
+                items.append((name + '_query_id_total', {'status': status}, value))
+            items.append((name + '_queries_total', {}, self._queries))
+            for metric, counts, buckets, total in (
+                ('_offset_rows', self._offsets, self.buckets, self._offset_sum),
+                ('_db_seconds', self._db_times, self.time_buckets, self._db_time_sum),
+                ):
+                histogram = self._histogram(counts, buckets)
+                for bound, value in histogram:
+                    items.append((name + metric + '_bucket', {'le': _format_bound(bound)}, value))
+                items.append((name + metric + '_count', {}, histogram[-1][1]))
+                items.append((name + metric + '_sum', {}, total))
+        return items
+
+    def render(self):
+        '''返回Prometheus文本格式的指标
+        '''
+        lines = []
+        for name, labels, value in self.samples():
+            label = ','.join('%s="%s"' % item for item in sorted(labels.items()))
+            lines.append('%s%s %s' % (name, '{%s}' % label if label else '', value))
+        return '\n'.join(lines) + '\n'
+
+    def collect(self):
+        '''prometheus_client自定义收集器接口
+        '''
+        if CounterMetricFamily is None:
+            raise ImportError('prometheus_client is required to register the collector.')
+        name = self.prefix
+        pages = CounterMetricFamily(name + '_pages', '分页请求数', labels=['branch', 'count_source', 'anchor'])
+        query_ids = CounterMetricFamily(name + '_query_id', '查询ID解码状态', labels=['status'])
+        with self._lock:
+            for key, value in self._pages.items():
+                pages.add_metric(list(key), value)
+            for status, value in self._query_ids.items():
+                query_ids.add_metric([status], value)
+            queries = CounterMetricFamily(name + '_queries', '数据库查询次数', value=self._queries)
+            offsets = HistogramMetricFamily(
+                name + '_offset_rows', '定位查询跳过的记录数',
+                buckets=[(_format_bound(b), v) for b, v in self._histogram(self._offsets, self.buckets)],
+                sum_value=self._offset_sum
+                )
+            db_times = HistogramMetricFamily(
+                name + '_db_seconds', '数据库查询耗时',
+                buckets=[(_format_bound(b), v) for b, v in self._histogram(self._db_times, self.time_buckets)],
+                sum_value=self._db_time_sum
+                )
+        return [pages, query_ids, queries, offsets, db_times]
+
+
+def _format_label(value):
+    return 'none' if value is None else str(value)
+
+
+def _format_bound(bound):
+    if bound == float('inf'):
+        return '+Inf'
+    return str(float(bound))
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageBoundary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('offset', models.BigIntegerField()),
+                ('values', models.TextField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'offset'], name='hugepagination_key_offset')],
+            },
+        ),
+    ]
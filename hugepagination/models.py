@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class PageBoundary(models.Model):
+    '''页边界索引，保存已登记的(模型, 排序方式)每隔interval条记录的排序键值和偏移量
+    见`hugepagination.boundary`
+    '''
+    # 登记键，格式为`模型标签:排序方式`
+    key = models.CharField(max_length=255)
+    # 记录在全表排序中的偏移量
+    offset = models.BigIntegerField()
+    # 排序键值列表，最后一个为主键，以`hugepagination.codec.pack`编码
+    values = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'offset'], name='hugepagination_key_offset'),
+        ]
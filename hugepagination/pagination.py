@@ -1,96 +1,415 @@
-import json
-import base64
-import decimal
-from urllib.parse import quote_from_bytes, unquote, urlunparse, urlparse, urlencode, parse_qs 
+import asyncio
+import threading
+import time
+import uuid
+import weakref
+import django
+from collections import OrderedDict
+from urllib.parse import urlunparse, urlparse, urlencode, parse_qs 
 from django.conf import settings
-from django.core.paginator import InvalidPage
-from rest_framework import pagination, serializers
+from django.core.paginator import InvalidPage, EmptyPage, Page, PageNotAnInteger
+from asgiref.sync import sync_to_async
+from rest_framework import pagination
 from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from django.core.paginator import Paginator
+from django.db import connections, close_old_connections
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Model, Q, Subquery, Window
+from django.db.models.expressions import OrderBy, RawSQL
+from django.db.models.functions import RowNumber
+from django.utils.translation import gettext_lazy as _
+from . import codec
+from .cache import (
+    get_anchor_cache, get_count_cache, get_histogram_cache, get_prefetch_cache, 
+    get_filter_fingerprint, get_queryset_fingerprint
+    )
+from .count import COUNT_EXACT, COUNT_ESTIMATE, estimate_count
+from .metrics import QueryStats, format_stats
+from .signals import page_served
 
-def get_queryset_ordering(queryset):
-    '''返回QuerySet对象的排序方式
+# 分页方式
+# 页码分页
+MODE_PAGE = 'page'
+# 键集分页，按游标翻页，不计算记录总数
+MODE_KEYSET = 'keyset'
+# 页码分页，多取一条记录判断是否还有下一页，不计算记录总数
+MODE_COUNTLESS = 'countless'
+
+# 本页记录读取方式
+# 先查询本页记录主键，再按主键读取记录
+FETCH_IDS = 'ids'
+# 定位查询作为子查询，一次查询读取本页记录
+FETCH_SUBQUERY = 'subquery'
+
+# 异步分页计数查询与定位查询并发执行时，正向扫描的最大页数，
+# 超过时先确定记录总数，可能从结束位置、直方图或窗口函数定位页边界更快
+CONCURRENT_SEEK_PAGES = 10
+
+def get_queryset_orderings(queryset):
+    '''返回QuerySet对象的全部排序项，没有排序时返回空列表
     '''
     if queryset.ordered:
-        orderings = queryset.query.extra_order_by or queryset.query.order_by or queryset.query.get_meta().ordering
-        ordering = orderings[0]
-        if ordering[0] == '-':
-            return (False, ordering[1:], ordering)
-        elif ordering[0] == '+':
-            return (True, ordering[1:], ordering)
-        return (True, ordering, ordering)
+        return list(queryset.query.extra_order_by or queryset.query.order_by or queryset.query.get_meta().ordering)
+    return []
+
+def get_queryset_ordering(queryset):
+    '''返回QuerySet对象的第一个排序方式(是否升序, 排序字段, 排序项)
+    '''
+    orderings = get_queryset_orderings(queryset)
+    if orderings:
+        keys, a_order, b_order, annotations = get_pagination_plan(queryset)
+        return (keys[0][1], keys[0][0], orderings[0])
     return None
 
 def reverse_ordering(ordering):
-    '''翻转排序字符串
+    '''翻转排序字符串或排序表达式
     '''
     if ordering is None:
         return None
+    if isinstance(ordering, OrderBy):
+        return ordering.copy().reverse_ordering()
     if ordering[0] == '-':
         return ordering[1:]
     if ordering[0] == '+':
         return '-' + ordering[1:]
     return '-' + ordering
 
-def get_next_record(queryset, current, prev=False):
-    '''从记录集中返回指定记录的后一条记录
+def is_nullable_path(model, name):
+    '''排序字段(可以是跨关联的字段路径)是否可能为空值，无法确定时返回True
     '''
-    ordering = get_queryset_ordering(queryset)
-    new_ordering = []
-    new_ordering.append(ordering[2])
-    if ordering is None:
-        ordering = (True, 'pk', 'pk')
-        new_ordering = ['pk',]
+    for part in name.split('__'):
+        try:
+            field = model._meta.pk if part == 'pk' else model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return True
+        if field.null or not field.concrete or field.many_to_many or field.one_to_many:
+            return True
+        if field.related_model is not None:
+            model = field.related_model
+    return False
 
-    if not ordering[1] in ('pk', 'id'):
-        if ordering[0]:
-            new_ordering.append('pk')
+def get_pagination_ordering(queryset):
+    '''返回分页使用的排序方式(排序键列表, 正向排序列表, 反向排序列表, 排序表达式注解)
+    排序键为[排序字段, 是否升序, 空值是否排在最后]，字段不允许空值时第三项为None，定位条件不需要空值分支。
+    最后一个排序键总是主键，保证记录顺序唯一。
+    排序项为字段以外的表达式时，以注解的形式加入查询，排序键使用注解名称
+    '''
+    nulls_largest = connections[queryset.db].features.nulls_order_largest
+    pk_names = ('pk', 'id', queryset.model._meta.pk.name, queryset.model._meta.pk.attname)
+    keys = []
+    a_order = []
+    annotations = {}
+    for item in get_queryset_orderings(queryset):
+        if isinstance(item, str):
+            if item == '?':
+                # 随机排序无法分页定位，忽略
+                continue
+            asc = item[0] != '-'
+            name = item.lstrip('-+')
+            nulls_last = nulls_largest == asc
+            order = name if asc else item
+            nullable = is_nullable_path(queryset.model, name)
         else:
-            new_ordering.append('-pk')
+            if not isinstance(item, OrderBy):
+                item = item.asc()
+            asc = not item.descending
+            if item.nulls_first or item.nulls_last:
+                nulls_last = bool(item.nulls_last)
+            else:
+                nulls_last = nulls_largest == asc
+            order = item
+            nullable = True
+            if isinstance(item.expression, F):
+                name = item.expression.name
+                nullable = is_nullable_path(queryset.model, name)
+            else:
+                name = '_hugepagination_order_%d' % len(annotations)
+                annotations[name] = item.expression
+                order = OrderBy(
+                    F(name), 
+                    descending=item.descending, 
+                    nulls_first=item.nulls_first or None, 
+                    nulls_last=item.nulls_last or None
+                    )
 
-    if prev:
-        new_ordering[0] = reverse_ordering(new_ordering[0])
-        if len(new_ordering) > 1:
-             new_ordering[1] = reverse_ordering(new_ordering[1])
-    
-    queryset = queryset.order_by(*new_ordering)
+        if name in pk_names:
+            keys.append(['pk', asc, None])
+            a_order.append(order)
+            break
+        keys.append([name, asc, nulls_last if nullable else None])
+        a_order.append(order)
+    else:
+        # 主键的排序方向与第一个排序键一致
+        pk_asc = keys[0][1] if keys else True
+        keys.append(['pk', pk_asc, None])
+        a_order.append('pk' if pk_asc else '-pk')
+    b_order = [reverse_ordering(item) for item in a_order]
+    return keys, a_order, b_order, annotations
 
-    refer_id = current.pk
-    refer_field = ordering[1]
+# 分页排序方式缓存，{(模型, 数据库别名, 排序项): 分页排序方式}，超出数量限制时淘汰最久未使用的条目
+PLAN_CACHE_SIZE = 512
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
 
-    refer_val = getattr(current, refer_field, None)
-    next = None
-    if len(new_ordering) > 1:
-        if refer_val is None:
-            cond = {refer_field + '__isnull': True}
-        else:
-            cond = {refer_field: refer_val}
+def get_pagination_plan(queryset):
+    '''返回分页排序方式，与get_pagination_ordering()相同
+    排序项都是字符串时按(模型, 数据库别名, 排序项)在进程内缓存，同一列表视图的后续请求不再重新推导。
+    分页排序方式只取决于模型字段和排序项，与筛选条件无关，不同筛选条件共用同一条目。
+    返回的列表是共享对象，不能修改
+    '''
+    orderings = get_queryset_orderings(queryset)
+    if not all(isinstance(item, str) for item in orderings):
+        # 排序表达式每次请求都是新的对象，不缓存
+        return get_pagination_ordering(queryset)
+    key = (queryset.model, queryset.db, tuple(orderings))
+    with _plans_lock:
+        plan = _plans.get(key, None)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return plan
+    plan = get_pagination_ordering(queryset)
+    with _plans_lock:
+        _plans[key] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
+
+def get_record_values(record, keys):
+    '''返回记录的排序键值列表
+    '''
+    values = []
+    for key in keys:
+        value = record
+        for attr in key[0].split('__'):
+            value = getattr(value, attr, None) if value is not None else None
+        if isinstance(value, Model):
+            # 外键字段以关联记录的主键比较
+            value = value.pk
+        values.append(value)
+    return values
 
-        if (ordering[0] and not prev) or (not ordering[0] and prev):
-            cond['pk__gt'] = refer_id
+def get_seek_condition(keys, values, after=True, inclusive=None):
+    '''返回以参考记录为界的定位条件，相当于行值比较`(k1, k2, ..., pk) >= (v1, v2, ..., pk)`
+    @keys  排序键列表，最后一个排序键为主键
+    @values  参考记录的排序键值列表
+    @after  True返回参考记录之后的记录条件，False返回参考记录之前的记录条件
+    @inclusive  是否包含参考记录，默认after为True时包含
+    '''
+    if inclusive is None:
+        inclusive = after
+    cond = None
+    for (name, asc, nulls_last), value in reversed(list(zip(keys, values))):
+        lookup = '__gt' if asc == after else '__lt'
+        # 空值是否位于定位方向一侧，字段不允许空值时不加入空值条件，可以使用索引范围扫描
+        nulls_after = nulls_last is not None and nulls_last == after
+        if cond is None:
+            # 主键决定是否包含参考记录
+            cond = Q(**{name + lookup + ('e' if inclusive else ''): value})
+        elif value is None:
+            # 参考记录排序键为空值，空值之间按后续排序键排序
+            xcond = Q(**{name + '__isnull': True}) & cond
+            if not nulls_after:
+                xcond |= Q(**{name + '__isnull': False})
+            cond = xcond
         else:
-            cond['pk__lt'] = refer_id 
-        next = queryset.filter(**cond).first()
-    
-    if next:
-        return next
+            # 展开为 k >= v AND (k > v OR 后续排序键条件)，可以使用排序键索引进行范围扫描
+            gt = Q(**{name + lookup: value})
+            ge = Q(**{name + lookup + 'e': value})
+            if nulls_after:
+                gt |= Q(**{name + '__isnull': True})
+                ge |= Q(**{name + '__isnull': True})
+            cond = ge & (gt | cond)
+    return cond
 
-    if refer_val is None:
-        cond = cond = {refer_field + '__isnull': False}
-        next = queryset.filter(**cond).first()
+def _get_next_queryset(queryset, keys, values, a_order, b_order, prev):
+    '''返回后一条(prev为True时前一条)记录的查询
+    定位查询只读取主键，可以由排序字段与主键的联合索引覆盖，只有找到的记录回表读取
+    '''
+    cond = get_seek_condition(keys, values, after=not prev, inclusive=False)
+    pks = queryset.filter(cond).order_by(*(b_order if prev else a_order)).values_list('pk', flat=True)[:1]
+    return queryset.filter(pk__in=get_pk_subquery(pks))
 
-    if next:
-        return next
+def get_next_record(queryset, current, prev=False):
+    '''从记录集中返回指定记录的后一条记录
+    '''
+    keys, a_order, b_order, annotations = get_pagination_plan(queryset)
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+        values = list(queryset.filter(pk=current.pk).values_list(*[key[0] for key in keys]).first())
+    else:
+        values = get_record_values(current, keys)
+    return _get_next_queryset(queryset, keys, values, a_order, b_order, prev).first()
 
-    asc = not ordering[0] if prev else ordering[0]
-    if asc:
-        cond = {refer_field + '__gt': refer_val}
+async def aget_next_record(queryset, current, prev=False):
+    '''get_next_record()的异步版本
+    '''
+    keys, a_order, b_order, annotations = get_pagination_plan(queryset)
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+        values = list(await queryset.filter(pk=current.pk).values_list(*[key[0] for key in keys]).afirst())
     else:
-        cond = {refer_field + '__lt': refer_val}
+        values = await sync_to_async(get_record_values)(current, keys)
+    return await _get_next_queryset(queryset, keys, values, a_order, b_order, prev).afirst()
+
+def get_turnpage_plan(queryset):
+    '''返回合并查询当前记录及前后记录所需的(排序键列表, 正向排序列表, 反向排序列表, 排序字段属性名列表)
+    排序键含可为空字段、关联字段或表达式时无法以子查询取得参考值，返回None
+    '''
+    keys, a_order, b_order, annotations = get_pagination_plan(queryset)
+    if annotations:
+        return None
+    meta = queryset.model._meta
+    attnames = []
+    for name, asc, nulls_last in keys:
+        if name == 'pk':
+            attnames.append(meta.pk.attname)
+            continue
+        try:
+            field = meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.null or not field.concrete or field.many_to_many or field.one_to_many:
+            return None
+        attnames.append(field.attname)
+    return keys, a_order, b_order, attnames
+
+def get_turnpage_queryset(queryset, pk, plan):
+    '''返回一次查询取得当前记录、后一条和前一条记录的QuerySet对象
+    当前记录的排序键值以标量子查询代入定位条件，当前记录和前后记录的主键查询以`UNION ALL`合并在同一个派生表中
+    '''
+    keys, a_order, b_order, attnames = plan
+    base = queryset.model._default_manager.using(queryset.db).filter(pk=pk)
+    values = [Subquery(base.values(attname)[:1]) for attname in attnames]
+    pks = queryset.order_by().values_list('pk', flat=True)
+    xnext = pks.filter(get_seek_condition(keys, values, True, False)).order_by(*a_order)[:1]
+    xprev = pks.filter(get_seek_condition(keys, values, False, False)).order_by(*b_order)[:1]
+    return queryset.filter(pk__in=get_pk_subquery(pks.filter(pk=pk), xnext, xprev)).order_by(*a_order)
+
+def split_turnpage_records(records, pk, plan):
+    '''从合并查询结果中分出(当前记录, 后一条记录, 前一条记录)，当前记录不在记录集中时全部为None
+    '''
+    keys, a_order, b_order, attnames = plan
+    current = None
+    for record in records:
+        if str(record.pk) == str(pk):
+            current = record
+    if current is None:
+        return None, None, None
+    cvalues = [getattr(current, attname) for attname in attnames]
+    xnext = None
+    xprev = None
+    for record in records:
+        if record is current:
+            continue
+        for (name, asc, nulls_last), attname, cvalue in zip(keys, attnames, cvalues):
+            value = getattr(record, attname)
+            if value != cvalue:
+                if (value > cvalue) == asc:
+                    xnext = record
+                else:
+                    xprev = record
+                break
+    return current, xnext, xprev
+
+# 排序键值编码函数缓存，{序列化器类: {字段名: 编码函数}}
+# 以序列化器类为弱引用键，代码重新加载后产生新的类对象，旧的缓存自动失效
+_value_encoders = weakref.WeakKeyDictionary()
+_default_encoders = {}
 
-    next = queryset.filter(**cond).first()
-    return next
+def _make_value_encoder(serial_field):
+    def encoder(value):
+        if isinstance(value, codec.NATIVE_TYPES):
+            return value
+        if serial_field is not None:
+            return serial_field.to_representation(value)
+        return str(value)
+    return encoder
+
+def get_value_encoder(serializer_class, field_name):
+    '''返回排序键值的编码函数，codec可以直接编码的值保持不变，其他值转换为序列化器字段的表示形式
+    编码函数按(序列化器类, 字段名)在进程内缓存，每个序列化器类只实例化一次
+    '''
+    encoders = _default_encoders
+    if serializer_class is not None:
+        encoders = _value_encoders.get(serializer_class, None)
+        if encoders is None:
+            encoders = {None: serializer_class().get_fields()}
+            _value_encoders[serializer_class] = encoders
+    encoder = encoders.get(field_name, None)
+    if encoder is None:
+        fields = encoders.get(None, None) or {}
+        encoder = _make_value_encoder(fields.get(field_name, None))
+        encoders[field_name] = encoder
+    return encoder
+
+def supports_window_locator(queryset):
+    '''判断是否可以使用窗口函数定位页边界
+    需要数据库支持窗口函数(PostgreSQL, MySQL 8, SQLite 3.25以上)，并且Django版本支持按窗口函数筛选(4.2以上)
+    '''
+    return django.VERSION >= (4, 2) and connections[queryset.db].features.supports_over_clause
+
+def run_in_own_connection(func):
+    '''返回在线程池中执行func的异步函数，func使用所在线程独立的数据库连接，可以与其他查询并发执行
+    执行结束后按CONN_MAX_AGE清理该线程的数据库连接
+    '''
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+def get_pk_subquery(*querysets):
+    '''将已切片的主键查询包装为派生表子查询，用于`pk__in`条件
+    MySQL不支持在IN子查询中直接使用LIMIT，包装为派生表后各数据库均可使用。
+    多个主键查询各自包装为派生表后以`UNION ALL`合并在同一个派生表中，外层查询只有一个`pk IN`条件，
+    避免`pk IN (...) OR pk IN (...)`使数据库无法使用主键索引
+    '''
+    parts = []
+    params = []
+    for queryset in querysets:
+        sql, xparams = queryset.query.get_compiler(queryset.db).as_sql()
+        parts.append(sql)
+        params.extend(xparams)
+    if len(parts) == 1:
+        return RawSQL('SELECT * FROM (%s) hugepagination_page' % parts[0], params)
+    sql = ' UNION ALL '.join(
+        'SELECT * FROM (%s) hugepagination_page%d' % (sql, i) for i, sql in enumerate(parts)
+    )
+    return RawSQL('SELECT * FROM (%s) hugepagination_page' % sql, params)
+
+def add_anchor(anchors, anchor, distance, limit):
+    '''向参考记录列表加入新的参考记录
+    偏移量与新参考记录相差小于distance的旧参考记录被替换，超出数量限制时淘汰最久未使用的参考记录
+    '''
+    for item in anchors:
+        if abs(item[0] - anchor[0]) < distance:
+            anchors.remove(item)
+            break
+    anchors.append(anchor)
+    while len(anchors) > limit:
+        anchors.pop(0)
+
+class CountlessPage(Page):
+    '''不计算记录总数的页对象，是否还有下一页由多取的一条记录决定
+    '''
+    def __init__(self, object_list, number, paginator, more):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def has_next(self):
+        return self.more
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    def end_index(self):
+        return self.start_index() + len(self) - 1 if len(self) else 0
 
 class HugePaginator(Paginator):
     '''超大数据表分页类
@@ -100,6 +419,24 @@ class HugePaginator(Paginator):
     @orphans  孤儿记录数
     @allow_empty_first_page 是否允许首页空
     @query_id 查询ID
+    @max_anchors 查询ID中保存的参考记录最大数量
+    @anchor_cache 参考记录共享缓存，见`hugepagination.cache`
+    @count_strategy 记录总数计算方式，见`hugepagination.count`
+    @count_threshold 混合计数方式下使用估算值的记录数阈值
+    @fetch_mode 本页记录读取方式
+    @prefetch_pages 预取当前页前后相邻页的数量
+    @prefetch_cache 预取页缓存，见`hugepagination.cache`
+    @query_id_max_age 查询ID有效期(秒)，None不限制
+    @concurrent_count 异步分页时计数查询是否与定位查询并发执行
+    @locator_pages 没有参考记录时以窗口函数一次定位的页边界数量，0不使用
+    @page_boundaries 是否使用页边界索引，见`hugepagination.boundary`
+    @count_cache 记录总数缓存，见`hugepagination.cache.CountCache`
+    @count_max_age 查询ID中记录总数和参考记录的最长使用时间(秒)，超过后丢弃并重新取得，None不限制
+    @histogram_cache 排序键直方图缓存，见`hugepagination.cache.HistogramCache`
+    @replica 只读副本的数据库别名，计数、定位和建立参考记录的查询在只读副本执行，本页记录仍按数据库路由读取
+    @replica_fallback 只读副本上得到的页不满或为空时，是否改为在主库重新分页
+    @version_cache 记录查询涉及模型版本号的缓存，BaseAnchorCache实例，None时anchor_cache为多进程共享缓存则使用anchor_cache，
+        否则不记录版本号，False不记录版本号，模型数据改变后查询ID中的记录总数和参考记录失效
     '''
     def __init__(
         self, 
@@ -108,244 +445,1021 @@ class HugePaginator(Paginator):
         orphans=0, 
         allow_empty_first_page=True, 
         query_id=None,
-        serializer_class=None
+        serializer_class=None,
+        max_anchors=10,
+        anchor_cache=None,
+        count_strategy=COUNT_EXACT,
+        count_threshold=100000,
+        fetch_mode=FETCH_IDS,
+        prefetch_pages=0,
+        prefetch_cache=None,
+        query_id_max_age=86400,
+        concurrent_count=True,
+        locator_pages=0,
+        page_boundaries=False,
+        count_cache=None,
+        count_max_age=300,
+        histogram_cache=None,
+        replica=None,
+        replica_fallback=True,
+        version_cache=None
         ):
         super().__init__(object_list, per_page, orphans, allow_empty_first_page)
         self.serializer_class = serializer_class
+        self.query_id_max_age = query_id_max_age
+        self.concurrent_count = concurrent_count
+        self.locator_pages = locator_pages
+        self.page_boundaries = page_boundaries
+        self.count_cache = count_cache
+        self.count_max_age = count_max_age
+        self.histogram_cache = histogram_cache
+        self.replica = replica
+        self.replica_fallback = replica_fallback
+        # 是否在只读副本执行计数和定位查询，改为在主库重新分页后为False
+        self._replica_active = bool(replica)
+        self.max_anchors = max_anchors
+        self.anchor_cache = anchor_cache
+        if version_cache is None and anchor_cache and anchor_cache.shared:
+            version_cache = anchor_cache
+        # 进程内缓存的版本号在各进程之间不一致，只有明确指定时使用
+        self.version_cache = version_cache or None
+        self._cache_key = None
+        self._shared = None
+        # 查询涉及模型的版本号，见BaseAnchorCache.get_versions
+        self._data_version = None
+        # (去掉排序后的指纹, QuerySet指纹)，见_get_fingerprint
+        self._fingerprints = None
+        self.count_strategy = count_strategy
+        self.count_threshold = count_threshold
+        self.fetch_mode = fetch_mode
+        self.prefetch_pages = prefetch_pages
+        self.prefetch_cache = prefetch_cache if prefetch_pages else None
+        # 本页是否从预取缓存读取
+        self.prefetch_hit = False
+        self._prefetch_key = None
+        # 客户端预取命名空间，由客户端参考记录定位得到的预取页按查询ID中的命名空间保存，不加入共享的预取页
+        self._prefetch_space = None
+        # 记录总数是否为估算值
+        self.count_approximate = False
         self._count = None
-        self._ordering_field = None
-        self._ordering_asc = True
-        self._middle_value = None
-        self._middle_offset = None
+        # 查询ID中记录总数和参考记录最初取得的时间
+        self._count_time = None
+        # 本次分页是否已经因记录总数偏差重新计数
+        self._recounted = False
+        # 排序键列表，见get_pagination_ordering
+        self._ordering = None
+        self._annotations = {}
+        # 分页排序方式，见get_pagination_plan，每个分页器只确定一次
+        self._plan = None
+        # 定位查询的基础QuerySet对象，每个分页器只构造一次
+        self._queryset = None
+        self._seek_base = None
+        # 参考记录列表，元素为[偏移量, 排序键值列表]，按最近使用顺序排列
+        self._anchors = []
+        # 来自客户端查询ID的参考记录，以及由它们定位得到的参考记录，不加入共享缓存
+        self._client_anchors = []
+        # 本页是否由客户端提供的参考记录或记录总数定位
+        self._client_derived = False
+        # 本次分页的执行情况，见hugepagination.signals.page_served
+        self.stats = {
+            'query_id': 'none',
+            'count_source': None,
+            'branch': None,
+            'offset': None,
+            'anchor': None,
+            'replica': 'replica' if replica else None,
+        }
         if query_id:
             qc = None
+            self.stats['query_id'] = 'invalid'
             try:
                 qc = self._decode_query_id(query_id)
-            except:
+            except (codec.BadToken, TypeError, ValueError):
                 pass
+            if qc and self._is_stale_query_id(qc):
+                # 查询条件不同、查询涉及的模型数据已经改变或超过最长使用时间，查询ID中的记录总数和参考记录失效
+                self.stats['query_id'] = 'stale'
+                self._ordering = qc[1]
+                qc = None
             if qc:
+                self.stats['query_id'] = 'decoded'
+                if qc[0] is not None:
+                    self.stats['count_source'] = 'query_id'
                 self._count = qc[0]
-                self._ordering_field = qc[1]
-                self._ordering_asc = qc[2]
-                self._middle_value = qc[3]
-                self._middle_offset = qc[4]
+                self._ordering = qc[1]
+                self._anchors = [list(anchor) for anchor in qc[2]][-self.max_anchors:]
+                self._client_anchors = list(self._anchors)
+                self.count_approximate = qc[3]
+                # 早期版本的查询ID没有记录总数的时间
+                self._count_time = qc[4] if len(qc) > 4 else None
+                self._prefetch_space = qc[7] if len(qc) > 7 else None
 
     def _encode_query_id(
         self, 
         count, 
-        ordering_field=None, 
-        ordering_asc=None, 
-        middle_value=None,
-        middle_offset=None
+        ordering=None, 
+        anchors=None,
+        count_approximate=False,
+        count_time=None,
+        data_version=None,
+        fingerprint=None,
+        prefetch_space=None
         ):
         '''编码查询ID
+        排序键值按类型直接编码，无法直接编码的值使用序列化器字段的表示形式
+        @data_version  查询涉及模型的版本号，数据改变后查询ID中的记录总数和参考记录失效
+        @fingerprint  QuerySet对象指纹，筛选条件或排序方式不同时查询ID中的记录总数和参考记录失效
+        @prefetch_space  客户端预取命名空间，见_get_prefetch_key
         '''
-        mval = middle_value
-        
-        if self.serializer_class and mval:  
-            serializer = self.serializer_class() 
-            fields = serializer.get_fields()
-            serial_field = fields.get(ordering_field, None)
-            if isinstance(serial_field, serializers.DateTimeField):
-                serial_field = serializers.DateTimeField(format='iso-8601')
-            if ordering_field: 
-                mval = serial_field.to_representation(mval)
-
-        jsonstr = json.dumps([
+        items = []
+        if anchors:
+            encoders = [get_value_encoder(self.serializer_class, key[0]) for key in ordering]
+            for offset, values in anchors:
+                items.append([offset, [encoder(value) for encoder, value in zip(encoders, values)]])
+
+        return codec.dumps([
             count,
-            ordering_field, 
-            ordering_asc, 
-            mval if not isinstance(mval, decimal.Decimal) else float(mval),
-            middle_offset if not isinstance(middle_offset, decimal.Decimal) else float(middle_offset)
-            ])
-        query_id = quote_from_bytes(base64.encodebytes(jsonstr.encode()))
-        return query_id
+            ordering, 
+            items,
+            count_approximate,
+            count_time,
+            data_version,
+            fingerprint,
+            prefetch_space
+            ], salt='hugepagination.query_id')
 
     def _decode_query_id(self, query_id):
-        '''解码查询ID
-        '''
-        qstr = unquote(query_id)
-        jsonstr = base64.decodebytes(qstr.encode()).decode()
-        qid = json.loads(jsonstr)
-        if self.serializer_class:  
-            serializer = self.serializer_class() 
-            fields = serializer.get_fields()
-            serial_field = fields.get(self._ordering_field, None)
-            if isinstance(serial_field, serializers.DateTimeField):
-                serial_field = serializers.DateTimeField(format='iso-8601')            
-            if serial_field: 
-                qid[3] = serial_field.to_representation(qid[3])
-        return qid
+        '''解码查询ID，查询ID无效、被篡改或已过期时抛出`codec.BadToken`
+        '''
+        return codec.loads(query_id, salt='hugepagination.query_id', max_age=self.query_id_max_age)
+
+    def _get_data_version(self):
+        '''返回查询涉及模型的版本号，没有配置版本号缓存时返回None
+        '''
+        if self._data_version is None and self.version_cache:
+            self._data_version = self.version_cache.get_versions(self.object_list)
+        return self._data_version
+
+    def _get_query_fingerprint(self):
+        '''返回加入查询ID的QuerySet对象指纹，截短以减少查询ID长度
+        '''
+        return self._get_fingerprint()[:16]
+
+    def _is_stale_query_id(self, qc):
+        '''查询ID来自其他筛选条件或排序方式，查询涉及模型的版本号已经改变，
+        或记录总数和参考记录超过最长使用时间时，查询ID失效
+        '''
+        if len(qc) < 7 or qc[6] != self._get_query_fingerprint():
+            return True
+        if self.version_cache and (len(qc) < 6 or qc[5] != self._get_data_version()):
+            return True
+        return self.count_max_age is not None and (
+            len(qc) < 5 or qc[4] is None or time.time() - qc[4] > self.count_max_age
+        )
+
+    def _get_fingerprint(self, ordered=True):
+        '''返回QuerySet对象的指纹，每个分页器只编译一次查询，参考记录、预取页、记录总数和直方图缓存共用
+        @ordered  是否包括排序方式，记录总数缓存使用去掉排序后的指纹
+        '''
+        if self._fingerprints is None:
+            fingerprint = get_filter_fingerprint(self.object_list)
+            self._fingerprints = (fingerprint, get_queryset_fingerprint(self.object_list, fingerprint))
+        return self._fingerprints[1 if ordered else 0]
+
+    def _get_shared(self):
+        '''返回共享缓存中的记录总数和参考记录，没有配置共享缓存时返回空条目
+        '''
+        if self._shared is None:
+            entry = None
+            if self.anchor_cache:
+                self._cache_key = self.anchor_cache.make_key(self.object_list, self._get_fingerprint())
+                entry = self.anchor_cache.get(self._cache_key)
+            if entry:
+                # 复制缓存条目，避免修改进程内缓存中的对象
+                entry = {
+                    'count': entry['count'], 
+                    'approximate': entry['approximate'], 
+                    'anchors': [list(a) for a in entry['anchors']]
+                    }
+            self._shared = entry or {'count': None, 'approximate': False, 'anchors': []}
+        return self._shared
+
+    def _save_shared(self):
+        '''保存记录总数和参考记录到共享缓存
+        '''
+        if self.anchor_cache and self._cache_key:
+            self.anchor_cache.set(self._cache_key, self._shared)
+
+    def _using_replica(self, queryset):
+        '''计数、定位和建立参考记录的查询配置了只读副本时在只读副本执行
+        '''
+        if self._replica_active:
+            return queryset.using(self.replica)
+        return queryset
+
+    def _fallback_to_primary(self):
+        '''只读副本数据可能延迟，改为在主库(按数据库路由)执行全部查询，丢弃参考记录，返回是否改为主库
+        '''
+        if not self._replica_active or not self.replica_fallback:
+            return False
+        self._replica_active = False
+        self._seek_base = None
+        self._anchors = []
+        self._get_shared()['anchors'] = []
+        self.stats['replica'] = 'fallback'
+        return True
+
+    def _compute_count(self):
+        '''按计数方式计算记录总数，返回(记录总数, 是否估算值)
+        '''
+        queryset = self._using_replica(self.object_list)
+        if self.count_strategy != COUNT_EXACT:
+            estimate = estimate_count(queryset)
+            if estimate is not None and (
+                self.count_strategy == COUNT_ESTIMATE or estimate >= self.count_threshold
+                ):
+                return estimate, True
+        return queryset.order_by().count(), False
+
+    def _lookup_count(self):
+        '''从记录总数缓存取得或计算记录总数，返回(记录总数, 是否估算值, 来源)
+        '''
+        if self.count_cache:
+            count, approximate, hit = self.count_cache.get_count(
+                self.object_list, self._compute_count, self._get_fingerprint(False)
+                )
+            if hit:
+                return count, approximate, 'count_cache'
+        else:
+            count, approximate = self._compute_count()
+        return count, approximate, 'estimate' if approximate else 'exact'
+
+    def _set_count(self, count, approximate, source=None):
+        '''修正记录总数
+        @source  记录总数来源，重新计数时设置
+        '''
+        if source:
+            self.stats['count_source'] = source
+        self._count = count
+        if self._count_time is None:
+            self._count_time = time.time()
+        self.count_approximate = approximate
+        if source or not self._client_derived:
+            # 由客户端提供的参考记录或记录总数推算的记录总数不加入共享缓存
+            shared = self._get_shared()
+            shared['count'] = count
+            shared['approximate'] = approximate
+        # num_pages是缓存属性，记录总数改变后需要重新计算
+        self.__dict__.pop('num_pages', None)
 
     @property
     def count(self):
         if self._count is None:
-            self._count = self.object_list.order_by().count()
+            shared = self._get_shared()
+            if shared['count'] is None:
+                shared['count'], shared['approximate'], self.stats['count_source'] = self._lookup_count()
+            else:
+                self.stats['count_source'] = 'cache'
+            self._count = shared['count']
+            if self._count_time is None:
+                self._count_time = time.time()
+            self.count_approximate = shared['approximate']
     
         return self._count
 
+    def _reset_count(self, count):
+        '''以精确计数结果修正记录总数，并更新记录总数缓存
+        '''
+        self._recounted = True
+        self._set_count(count, False, 'exact')
+        if self.count_cache:
+            self.count_cache.set_count(self.object_list, count, fingerprint=self._get_fingerprint(False))
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # 记录总数为估算值时不限制页码上限，超出实际记录范围时由page()修正
+            if not self.count_approximate or int(number) < 1:
+                raise
+            return int(number)
+
+    def _validate_page_number(self, number):
+        '''验证页码，只读副本上的记录总数不足请求的页码时，可能是只读副本数据延迟，改为在主库精确计数后重新验证
+        '''
+        try:
+            return self.validate_number(number)
+        except EmptyPage:
+            if not self._fallback_to_primary():
+                raise
+        self._reset_count(self.object_list.order_by().count())
+        return self.validate_number(number)
+
     @property
     def query_id(self):
+        if self._count_time is None:
+            # 不计算记录总数时，以第一次返回查询ID的时间作为参考记录的取得时间
+            self._count_time = time.time()
         return self._encode_query_id(
             self._count,
-            self._ordering_field,
-            self._ordering_asc,
-            self._middle_value,
-            self._middle_offset
+            self._ordering,
+            self._anchors,
+            self.count_approximate,
+            self._count_time,
+            self._get_data_version(),
+            self._get_query_fingerprint(),
+            self._prefetch_space
         )
 
-    def page(self, number):
-        number = self.validate_number(number)
-        bottom = (number - 1) * self.per_page
-        top = bottom + self.per_page
-        if top + self.orphans >= self.count:
-            top = self.count
+    def _nearest_anchor(self, bottom, top):
+        '''返回距离查询范围最近的参考记录及扫描距离，没有比首尾更近的参考记录时返回None
+        '''
+        nearest = None
+        distance = bottom
+        if not self.count_approximate:
+            distance = min(bottom, self.count - top)
+        for anchor in self._anchors + self._get_shared()['anchors']:
+            offset = anchor[0]
+            if offset <= bottom:
+                xdistance = bottom - offset
+            elif offset >= top:
+                xdistance = offset - top
+            else:
+                xdistance = 0
+            if xdistance < distance:
+                nearest = anchor
+                distance = xdistance
+        return nearest, distance
 
-        ordering = get_queryset_ordering(self.object_list)
-        new_ordering = []
-        if ordering is None:
-            # 如果没有排序，默认以主键排序
-            ordering = (True, 'pk')
-            new_ordering = ['pk']
-        else:
-            new_ordering.append(ordering[2])
+    def _is_client_anchor(self, anchor):
+        return any(anchor is item for item in self._client_anchors)
 
-        if not ordering[1] in ('pk', 'id'):
-            if ordering[0]:
-                new_ordering.append('pk')
-            else:
-                new_ordering.append('-pk')
-
-        if self._ordering_asc != ordering[0] or self._ordering_field != ordering[1]:
-            # 排序条件改变，中间参考记录失效
-            self._middle_offset = None
-            self._middle_value = None
-
-        self._ordering_asc = ordering[0]
-        self._ordering_field = ordering[1]
-
-        a_order = [*new_ordering]
-        b_order = []
-        b_order.append(reverse_ordering(a_order[0]))
-        if len(a_order)>1:
-            b_order.append(reverse_ordering(a_order[1]))
-
-        qset = self.object_list.order_by(*a_order)
-        ids = []
-        if self._middle_offset is None:
-            # 没有中间参考记录，以记录集首尾为参考点
-            mbottom = bottom
-            mtop = top
+    def _add_anchor(self, offset, values):
+        '''记录新的参考记录，同时加入共享缓存
+        由客户端提供的参考记录或记录总数定位得到的参考记录只加入查询ID，客户端数据可能已经过时
+        '''
+        anchor = [offset, values]
+        add_anchor(self._anchors, anchor, self.per_page, self.max_anchors)
+        if self._client_derived:
+            self._client_anchors.append(anchor)
+        elif self.anchor_cache:
+            add_anchor(
+                self._get_shared()['anchors'], 
+                [offset, values], 
+                self.per_page, 
+                self.anchor_cache.max_anchors
+                )
+
+    def _get_ordering(self):
+        '''确定分页排序方式，返回(正向排序列表, 反向排序列表)
+        '''
+        if self._plan is None:
+            self._plan = get_pagination_plan(self.object_list)
+            keys, a_order, b_order, annotations = self._plan
+            if self._ordering != keys:
+                # 排序条件改变，参考记录失效
+                self._anchors = []
+                self._client_anchors = []
+
+            self._ordering = keys
+            self._annotations = annotations
+        return self._plan[1], self._plan[2]
+
+    def _get_queryset(self):
+        '''返回用于定位的QuerySet对象，排序表达式以注解加入查询
+        '''
+        if self._queryset is None:
+            self._queryset = self.object_list
+            if self._annotations:
+                self._queryset = self.object_list.annotate(**self._annotations)
+        return self._queryset
+
+    def _get_seek_base(self, a_order):
+        '''返回按正向排序、只读取主键的定位查询基础QuerySet对象
+        '''
+        if self._seek_base is None:
+            self._seek_base = self._using_replica(self._get_queryset()).order_by(*a_order).only('pk')
+        return self._seek_base
+
+    def encode_cursor(self, reverse, values):
+        '''编码键集分页游标
+        @reverse  是否向前翻页
+        @values  参考记录排序键值列表
+        '''
+        values = [
+            get_value_encoder(self.serializer_class, key[0])(value) 
+            for key, value in zip(self._ordering, values)
+            ]
+        return codec.dumps([reverse, self._ordering, values], salt='hugepagination.cursor')
+
+    def decode_cursor(self, cursor):
+        '''解码键集分页游标，返回(是否向前翻页, 排序键值列表)，游标无效或排序条件改变时返回None
+        '''
+        self._get_ordering()
+        try:
+            reverse, ordering, values = codec.loads(cursor, salt='hugepagination.cursor')
+        except (codec.BadToken, TypeError, ValueError):
+            return None
+        if ordering != self._ordering:
+            return None
+        return reverse, values
+
+    def seek(self, values=None, reverse=False, limit=None, inclusive=False, stop=None):
+        '''键集定位，不使用偏移量扫描
+        返回参考记录之后(reverse为True时之前)的limit条记录，按正向排序
+        @values  参考记录排序键值列表，None从记录集首尾开始
+        @reverse  是否向前定位
+        @limit  最大记录数
+        @inclusive  是否包含参考记录
+        @stop  结束记录排序键值列表，只返回结束记录之前(reverse为True时之后)的记录，不包含结束记录
+        '''
+        rows = list(self._get_seek_queryset(values, reverse, inclusive, stop)[:limit])
+        if reverse:
+            rows.reverse()
+        return rows
+
+    async def aseek(self, values=None, reverse=False, limit=None):
+        '''seek()的异步版本
+        '''
+        rows = [item async for item in self._get_seek_queryset(values, reverse)[:limit]]
+        if reverse:
+            rows.reverse()
+        return rows
+
+    def _get_seek_queryset(self, values, reverse, inclusive=False, stop=None):
+        a_order, b_order = self._get_ordering()
+        self._set_branch('keyset', 0)
+        self.stats['anchor'] = 'miss' if values is None else 'hit'
+        qset = self._get_queryset().order_by(*(b_order if reverse else a_order))
+        if values is not None:
+            qset = qset.filter(get_seek_condition(self._ordering, values, after=not reverse, inclusive=inclusive))
+        if stop is not None:
+            qset = qset.filter(get_seek_condition(self._ordering, stop, after=reverse, inclusive=False))
+        return qset
+
+    def get_record_key(self, record):
+        '''返回记录的排序键值列表
+        '''
+        return get_record_values(record, self._ordering)
+
+    def _get_seeks(self, bottom, top, a_order, b_order):
+        '''返回定位偏移量范围[bottom, top)内记录的查询列表，元素为(已切片的QuerySet, 是否反向排序)
+        各查询结果按正向排序依次连接即为范围内的全部记录
+        '''
+        qset = self._get_seek_base(a_order)
+        anchor, distance = self._nearest_anchor(bottom, top)
+        self.stats['anchor'] = 'miss' if anchor is None else 'hit'
+        self._client_derived = anchor is not None and self._is_client_anchor(anchor)
+        if anchor is None:
+            # 没有更近的参考记录，以记录集首尾为参考点
             to_start = bottom 
             to_end = self.count - top
-            if to_start > to_end:
+            if to_start > to_end and not self.count_approximate:
                 # 距离结束位置近，以结束位置为参考
-                count = top - bottom
-                mbottom = to_end
-                mtop = mbottom + count
-                qset = self.object_list.order_by(*b_order)
-            qset = qset.only('pk').all()[mbottom:mtop]
-            ids = list(qset.values_list('pk', flat=True))
-        elif bottom <= self._middle_offset and top >= self._middle_offset:
-            # 需要查询的页跨越中间参考记录
-            hcount = top - self._middle_offset
-            lcount = self._middle_offset - bottom  
-            hcond = {}
-            lcond = {}          
-            if self._ordering_asc:
-                hcond = {
-                    self._ordering_field + '__gte': self._middle_value
-                }
-                lcond = {
-                    self._ordering_field + '__lt': self._middle_value
-                }          
-            else:
-                hcond = {
-                    self._ordering_field + '__lte': self._middle_value
-                }
-                lcond = {
-                    self._ordering_field + '__gt': self._middle_value
-                }  
-
-            hqset = qset.only('pk').filter(**hcond).all()[:hcount]
-            ids.extend(list(hqset.values_list('pk', flat=True))) 
-            lqset = qset.only('pk').filter(**lcond).order_by(*b_order).all()[:lcount]
-            ids.extend(list(lqset.values_list('pk', flat=True).all()))                   
-
-        elif bottom < self._middle_offset and (self._middle_offset - top) < bottom:
-            # 需要查询的页在开始位置到中间参考记录之间，并且距离中间参考记录较近
-            mbottom = self._middle_offset - top 
-            mtop = self._middle_offset - bottom
-            cond = {}
-            if self._ordering_asc:
-                cond = {
-                    self._ordering_field + '__lt': self._middle_value
-                }
-            else:
-                cond = {
-                    self._ordering_field + '__gt': self._middle_value
-                }                
-            mqset = qset.only('pk').filter(**cond).order_by(*b_order)[mbottom:mtop]
-            ids.extend(list(mqset.values_list('pk', flat=True)))
-
-        elif bottom < self._middle_offset:
-            # 需要查询的页在开始位置到中间参考记录之间，并且距离开始位置较近
-            mqset = qset.only('pk').all()[bottom:top]
-            ids.extend(list(mqset.values_list('pk', flat=True))) 
-
-        elif (bottom - self._middle_offset) <= (self.count - top):
-            # 需要查询的页在中间参考记录到结束位置之间，并且距离中间参考记录较近
-            mbottom = bottom - self._middle_offset
-            mtop = top - self._middle_offset
-            cond = {}
-            if self._ordering_asc:
-                cond = {
-                    self._ordering_field + '__gte': self._middle_value
-                }
-            else:
-                cond = {
-                    self._ordering_field + '__lte': self._middle_value
-                }
+                self._client_derived = self.stats['count_source'] == 'query_id'
+                self._set_branch('end', to_end)
+                return [(qset.order_by(*b_order)[to_end:self.count - bottom], True)]
+            self._set_branch('start', bottom)
+            return [(qset[bottom:top], False)]
+
+        # 最近使用的参考记录移到列表末尾
+        if anchor in self._anchors:
+            self._anchors.remove(anchor)
+            self._anchors.append(anchor)
+        else:
+            # 来自共享缓存的参考记录加入查询ID
+            add_anchor(self._anchors, list(anchor), 1, self.max_anchors)
+        offset, values = anchor
+        hcond = get_seek_condition(self._ordering, values, True)
+        lcond = get_seek_condition(self._ordering, values, False)
+        if offset <= bottom:
+            # 需要查询的页在参考记录之后
+            self._set_branch('after_anchor', bottom - offset)
+            return [(qset.filter(hcond)[bottom - offset:top - offset], False)]
+        elif offset >= top:
+            # 需要查询的页在参考记录之前
+            self._set_branch('before_anchor', offset - top)
+            return [(qset.filter(lcond).order_by(*b_order)[offset - top:offset - bottom], True)]
+        # 需要查询的页跨越参考记录
+        self._set_branch('straddle', 0)
+        return [
+            (qset.filter(lcond).order_by(*b_order)[:offset - bottom], True),
+            (qset.filter(hcond)[:top - offset], False)
+        ]
+
+    def _set_branch(self, branch, offset):
+        '''记录定位方式和扫描跳过的记录数
+        '''
+        self.stats['branch'] = branch
+        self.stats['offset'] = offset
+
+    def _get_prefetch_key(self, number, client=False):
+        '''返回预取页的缓存键
+        @client  是否为由客户端参考记录或记录总数定位得到的预取页，按查询ID中的客户端命名空间保存，
+            只有携带该查询ID的后续请求可以读取，客户端数据可能已经过时，不能共享
+        '''
+        if self._prefetch_key is None:
+            self._prefetch_key = self.prefetch_cache.make_key(self.object_list, self._get_fingerprint())
+        if client:
+            if self._prefetch_space is None:
+                self._prefetch_space = uuid.uuid4().hex[:16]
+            return '%s:%s:%s:%s' % (self._prefetch_key, self._prefetch_space, self.per_page, number)
+        return '%s:%s:%s' % (self._prefetch_key, self.per_page, number)
+
+    def _save_prefetch(self, number, keys, bottom):
+        '''保存相邻页的记录主键和第一条记录的排序键值到预取缓存
+        @number  当前页码
+        @keys  从偏移量bottom开始的记录排序键值列表，最后一个排序键为主键
+        '''
+        for xnumber in range(number - self.prefetch_pages, number + self.prefetch_pages + 1):
+            if xnumber == number or xnumber < 1:
+                continue
+            xbottom = (xnumber - 1) * self.per_page
+            xtop = xbottom + self.per_page
+            if xtop + self.orphans >= self.count and not self.count_approximate:
+                xtop = self.count
+            if xbottom < bottom or xbottom >= xtop or xtop - bottom > len(keys):
+                # 相邻页不在已取得的范围内
+                continue
+            xkeys = keys[xbottom - bottom:xtop - bottom]
+            self.prefetch_cache.set(
+                self._get_prefetch_key(xnumber, self._client_derived), 
+                ([item[-1] for item in xkeys], list(xkeys[0]))
+                )
+
+    def _get_locator_queryset(self, numbers):
+        '''返回以窗口函数`ROW_NUMBER()`一次取得多个页第一条记录排序键值的查询
+        '''
+        a_order, b_order = self._get_ordering()
+        rows = sorted(set((number - 1) * self.per_page + 1 for number in numbers))
+        names = [key[0] for key in self._ordering]
+        return self._using_replica(self._get_queryset()).annotate(
+            _hugepagination_row=Window(RowNumber(), order_by=a_order)
+            ).filter(
+            # 行号上限使数据库可以提前结束扫描
+            _hugepagination_row__lte=rows[-1], _hugepagination_row__in=rows
+            ).order_by().values_list('_hugepagination_row', *names)
+
+    def _learn_boundaries(self, rows):
+        # 页边界由窗口函数从数据库直接取得，不依赖客户端数据
+        self._client_derived = False
+        boundaries = []
+        for item in sorted(rows):
+            boundary = [item[0] - 1, list(item[1:])]
+            self._add_anchor(*boundary)
+            boundaries.append(boundary)
+        self._save_shared()
+        return boundaries
+
+    def locate_pages(self, numbers):
+        '''以窗口函数一次扫描定位多个页的边界，加入参考记录，返回页边界列表[偏移量, 排序键值列表]
+        页边界保存在查询ID和共享缓存中，之后访问这些页及其附近的页时直接定位，可用于生成任意页跳转目录
+        数据库不支持窗口函数时返回空列表
+        '''
+        numbers = [number for number in numbers if number > 1]
+        if not numbers or not supports_window_locator(self._using_replica(self.object_list)):
+            return []
+        return self._learn_boundaries(list(self._get_locator_queryset(numbers)))
+
+    async def alocate_pages(self, numbers):
+        '''locate_pages()的异步版本
+        '''
+        numbers = [number for number in numbers if number > 1]
+        if not numbers or not supports_window_locator(self._using_replica(self.object_list)):
+            return []
+        rows = [item async for item in self._get_locator_queryset(numbers)]
+        return await sync_to_async(self._learn_boundaries)(rows)
+
+    def _add_boundary(self, bottom):
+        '''从页边界索引取得不超过bottom的最近页边界，加入参考记录
+        '''
+        if not self.page_boundaries or bottom < self.per_page:
+            return
+        # boundary模块依赖本模块，在此导入避免循环导入
+        from .boundary import get_page_boundary
+        boundary = get_page_boundary(self.object_list, self._ordering, bottom)
+        if boundary is not None:
+            add_anchor(self._anchors, boundary, 1, self.max_anchors)
+
+    def _add_histogram_anchor(self, bottom, top):
+        '''没有参考记录时，从排序键直方图取得偏移量不超过bottom的最近边界，加入参考记录，之后只需从该排序键值短距离定位
+        直方图在请求之外建立，边界偏移量是建立时的准确值，请求中不执行抽样和计数查询
+        '''
+        if not self.histogram_cache or bottom < self.per_page:
+            return
+        anchor, distance = self._nearest_anchor(bottom, top)
+        if anchor is not None or distance < self.per_page:
+            return
+        # histogram模块依赖本模块，在此导入避免循环导入
+        from .histogram import build_histogram, find_bound
+        a_order, b_order = self._get_ordering()
+        qset = self._using_replica(self._get_queryset())
+        keys = self._ordering
+        # 记录总数只用于估计抽样区间宽度，可以是估算值
+        count = self.count
+        histogram = self.histogram_cache.get_histogram(
+            qset, 
+            lambda buckets, sample_size: build_histogram(qset, keys, a_order, count, buckets, sample_size),
+            self._get_fingerprint(),
+            # 本次请求精确计数时检查直方图建立后记录总数是否改变(批量更新不发送信号)
+            count if self.stats['count_source'] == 'exact' else None
+        )
+        if histogram is None:
+            return
+        bound = find_bound(histogram, bottom)
+        if bound is not None:
+            add_anchor(self._anchors, bound, 1, self.max_anchors)
+
+    def _get_locate_numbers(self, bottom, top, number):
+        '''没有参考记录并且需要从开始位置扫描时，返回从第1页到本页等间隔的locator_pages个页码，否则返回空列表
+        '''
+        if not self.locator_pages or bottom < self.per_page:
+            return []
+        anchor, distance = self._nearest_anchor(bottom, top)
+        if anchor is not None or distance != bottom:
+            return []
+        stride = max(1, number // self.locator_pages)
+        return [number - i * stride for i in range(self.locator_pages) if number - i * stride > 1]
+
+    def _get_forward_seeks(self, bottom, top, a_order):
+        '''返回不依赖记录总数的定位查询列表，从不超过bottom的最近参考记录或开始位置正向定位
+        '''
+        qset = self._get_seek_base(a_order)
+        nearest = None
+        for anchor in self._anchors + self._get_shared()['anchors']:
+            if anchor[0] <= bottom and (nearest is None or anchor[0] > nearest[0]):
+                nearest = anchor
+        self.stats['anchor'] = 'miss' if nearest is None else 'hit'
+        self._client_derived = nearest is not None and self._is_client_anchor(nearest)
+        if nearest is None:
+            self._set_branch('start', bottom)
+            return [(qset[bottom:top], False)]
+        offset, values = nearest
+        self._set_branch('after_anchor', bottom - offset)
+        hcond = get_seek_condition(self._ordering, values, True)
+        return [(qset.filter(hcond)[bottom - offset:top - offset], False)]
+
+    def _get_page_range(self, number):
+        '''返回本页的偏移量范围(bottom, top)
+        '''
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count and not self.count_approximate:
+            top = self.count
+        return bottom, top
+
+    def _get_window(self, bottom, top):
+        '''返回定位范围，启用预取时扩大到相邻页
+        '''
+        wbottom = bottom
+        wtop = top
+        if self.prefetch_cache:
+            # 扩大定位范围，同时取得相邻页的记录主键
+            wbottom = max(0, bottom - self.prefetch_pages * self.per_page)
+            wtop = top + self.prefetch_pages * self.per_page
+            if not self.count_approximate:
+                wtop = min(wtop, self.count)
+        return wbottom, wtop
+
+    def _get_prefetched(self, number):
+        '''返回预取缓存中本页的(记录主键列表, 第一条记录排序键值)，没有时返回None
+        先读取客户端命名空间中的预取页，再读取共享的预取页
+        '''
+        entry = None
+        client = False
+        if self.prefetch_cache:
+            if self._prefetch_space is not None:
+                entry = self.prefetch_cache.get(self._get_prefetch_key(number, True))
+                client = entry is not None
+            if entry is None:
+                entry = self.prefetch_cache.get(self._get_prefetch_key(number))
+        self.prefetch_hit = entry is not None
+        if self.prefetch_hit:
+            self._client_derived = client
+            self._set_branch('prefetch', 0)
+        return entry
+
+    def _read_ahead(self, number, bottom, top, a_order, first):
+        '''预取缓存命中并且下一页不在预取缓存中时，从本页第一条记录正向定位，一次查询读取本页及之后prefetch_pages页的记录，
+        同时保存之后各页到预取缓存，连续翻页时每页只需要一次查询。返回本页记录列表，不需要预读时返回None
+        排序字段包括关联字段时，读取排序键值需要额外查询；使用只读副本时定位查询不能与读取记录合并，均不预读
+        '''
+        if first is None or self._replica_active or (not self.count_approximate and top >= self.count):
+            return None
+        if any('__' in key[0] for key in self._ordering):
+            return None
+        if self.prefetch_cache.has(self._get_prefetch_key(number + 1, self._client_derived)):
+            return None
+        wtop = top + self.prefetch_pages * self.per_page
+        if not self.count_approximate:
+            wtop = min(wtop, self.count)
+        pks = self._get_seek_base(a_order).filter(get_seek_condition(self._ordering, first, True))
+        rows = list(self._get_page_rset(a_order, get_pk_subquery(pks.values_list('pk')[:wtop - bottom])))
+        keys = [self.get_record_key(row) for row in rows]
+        self._save_prefetch(number, keys, bottom)
+        return rows[:top - bottom]
 
-            mqset = qset.only('pk').filter(**cond).all()[mbottom:mtop]
-            ids.extend(list(mqset.values_list('pk', flat=True))) 
+    def _get_subquery_rset(self, seeks, a_order):
+        '''定位查询作为子查询，一次查询取得本页记录，保留原QuerySet的注解和关联查询
+        '''
+        pks = [mqset.values_list('pk', flat=True) for mqset, reverse in seeks]
+        return self._get_queryset().filter(pk__in=get_pk_subquery(*pks)).order_by(*a_order)
+
+    def _split_keys(self, number, bottom, top, wbottom, wkeys):
+        '''从定位范围的排序键值列表中取出本页的(记录主键列表, 第一条记录排序键值)，并保存相邻页到预取缓存
+        由客户端参考记录定位得到的相邻页保存在客户端命名空间中，见_get_prefetch_key
+        '''
+        if self.prefetch_cache:
+            self._save_prefetch(number, wkeys, wbottom)
+        pkeys = wkeys[bottom - wbottom:top - wbottom]
+        return [item[-1] for item in pkeys], list(pkeys[0]) if pkeys else None
+
+    def _fetch_keys(self, seeks):
+        '''执行定位查询，返回按正向排序的排序键值列表，最后一个排序键为主键
+        定位查询只读取排序字段和主键，可以由排序字段与主键的联合索引覆盖，参考记录、预取页和下一页的参考值都从排序键值得到，
+        只有本页记录按主键回表读取
+        '''
+        names = [key[0] for key in self._ordering]
+        wkeys = []
+        for mqset, reverse in seeks:
+            xkeys = list(mqset.values_list(*names))
+            if reverse:
+                xkeys.reverse()
+            wkeys.extend(xkeys)
+        return wkeys
 
+    def _get_page_rset(self, a_order, ids):
+        '''按主键读取本页记录，保持惰性求值，由序列化器读取
+        '''
+        if self.fetch_mode == FETCH_SUBQUERY:
+            rset = self._get_queryset()
         else:
-            # 需要查询的页在中间参考记录到结束位置之间，并且距离结束位置较近
-            mbottom = self.count - top
-            mtop = self.count - bottom   
-            mqset = qset.only('pk').order_by(*b_order)[mbottom:mtop]          
-            ids.extend(list(mqset.values_list('pk', flat=True))) 
-
-        rset = self.object_list.model.objects.filter(pk__in=ids).order_by(*a_order)
-
-        # 寻找新的中间记录
-        aval = None
-        bval = None
-        mcount = 0 
-        moffset = None
-        mval = None
-        for item in list(rset):
-            xval = getattr(item, self._ordering_field, None)
-            aval = bval
-            bval = xval
-            if aval is not None and bval is not None and  aval != bval:
-                moffset = mcount
-                mval = xval
-            mcount += 1
-
-        if mval is not None:
-            self._middle_value = mval
-            self._middle_offset = bottom + moffset
-        elif (mcount == 1 and bval is not None) and ((bottom == 0 and self._middle_value is None) 
-             or (self._middle_value != bval and (bottom - 1) == self._middle_offset)):
-            self._middle_offset = bottom 
-            self._middle_value = bval
+            rset = self.object_list.model.objects.annotate(**self._annotations)
+        return rset.filter(pk__in=ids).order_by(*a_order)
+
+    def _finish_page(self, number, bottom, top, a_order, ids, first, rset=None):
+        '''修正记录总数，学习参考记录，返回页对象
+        估算记录总数偏大，本页超出实际记录范围时返回None，需要精确计数后重新分页
+        记录总数来自查询ID或缓存，本页不满时说明记录已经减少，同样返回None
+        '''
+        if rset is None:
+            rset = self._get_page_rset(a_order, ids)
+
+        if (not ids or (not self.count_approximate and len(ids) < top - bottom)) and self._fallback_to_primary():
+            # 只读副本上得到的页不满或为空
+            return None
+        if self.count_approximate:
+            if not ids and number > 1:
+                return None
+            if len(ids) < top - bottom:
+                # 本页不满，已经到达结束位置，可以得到准确的记录总数
+                self._set_count(bottom + len(ids), False)
+            elif top >= self._count:
+                # 估算记录总数偏小，保证可以翻到下一页
+                self._set_count(top + 1, True)
+        elif not self._recounted and len(ids) < top - bottom:
+            # 记录总数偏大，参考记录的偏移量也可能已经失效
+            self._anchors = []
+            self._get_shared()['anchors'] = []
+            return None
+
+        # 以本页第一条记录作为新的参考记录
+        if first is not None:
+            self._add_anchor(bottom, first)
+        self._save_shared()
 
         this_page = self._get_page(rset, number, self)
         this_page.query_id = self.query_id
         return this_page
 
+    def page(self, number):
+        number = self._validate_page_number(number)
+        bottom, top = self._get_page_range(number)
+        a_order, b_order = self._get_ordering()
+
+        rset = None
+        entry = self._get_prefetched(number)
+        if entry is None:
+            self._add_boundary(bottom)
+            self._add_histogram_anchor(bottom, top)
+            # 没有可用的参考记录时，以窗口函数一次定位本页及之前若干页的边界
+            self.locate_pages(self._get_locate_numbers(bottom, top, number))
+        if entry is not None:
+            # 预取缓存中保存了本页记录主键和第一条记录的排序键值
+            ids, first = entry
+            rows = self._read_ahead(number, bottom, top, a_order, first)
+            if rows is not None:
+                rset = rows
+                ids = [item.pk for item in rows]
+                first = self.get_record_key(rows[0]) if rows else None
+        elif self.fetch_mode == FETCH_SUBQUERY and not self.prefetch_cache:
+            rset = self._get_subquery_rset(self._get_seeks(bottom, top, a_order, b_order), a_order)
+            # 需要本页记录确定参考记录
+            rows = list(rset)
+            ids = [item.pk for item in rows]
+            first = self.get_record_key(rows[0]) if rows else None
+        else:
+            wbottom, wtop = self._get_window(bottom, top)
+            # 定位查询同时返回排序键值
+            wkeys = self._fetch_keys(self._get_seeks(wbottom, wtop, a_order, b_order))
+            ids, first = self._split_keys(number, bottom, top, wbottom, wkeys)
+
+        this_page = self._finish_page(number, bottom, top, a_order, ids, first, rset)
+        if this_page is None:
+            # 记录总数偏大，超出实际记录范围，改用精确计数
+            self._reset_count(self._using_replica(self.object_list).order_by().count())
+            return self.page(min(number, self.num_pages))
+        return this_page
+
+    def _validate_countless_number(self, number):
+        '''验证不计算记录总数时的页码，不检查页码上限
+        '''
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def _get_countless_seeks(self, number):
+        a_order, b_order = self._get_ordering()
+        bottom = (number - 1) * self.per_page
+        self._add_boundary(bottom)
+        # 多取一条记录判断是否还有下一页
+        return self._get_forward_seeks(bottom, bottom + self.per_page + 1, a_order)
+
+    def _finish_countless_page(self, number, wkeys):
+        '''学习参考记录，返回页对象
+        多取的一条记录是下一页的第一条记录，同时作为参考记录，翻到下一页时不需要跳过记录
+        '''
+        a_order, b_order = self._get_ordering()
+        bottom = (number - 1) * self.per_page
+        more = len(wkeys) > self.per_page
+        pkeys = wkeys[:self.per_page]
+        if not pkeys and (number > 1 or not self.allow_empty_first_page):
+            raise EmptyPage(_('That page contains no results'))
+        if pkeys:
+            self._add_anchor(bottom, list(pkeys[0]))
+        if more:
+            self._add_anchor(bottom + self.per_page, list(wkeys[self.per_page]))
+        self._save_shared()
+
+        rset = self._get_page_rset(a_order, [item[-1] for item in pkeys])
+        this_page = CountlessPage(rset, number, self, more)
+        this_page.query_id = self.query_id
+        return this_page
+
+    def page_countless(self, number):
+        '''不计算记录总数的页码分页，从不超过本页起始位置的最近参考记录或开始位置正向定位
+        不使用orphans、预取和从结束位置反向定位
+        '''
+        number = self._validate_countless_number(number)
+        wkeys = self._fetch_keys(self._get_countless_seeks(number))
+        if not wkeys and self._fallback_to_primary():
+            wkeys = self._fetch_keys(self._get_countless_seeks(number))
+        return self._finish_countless_page(number, wkeys)
+
+    async def apage_countless(self, number):
+        '''page_countless()的异步版本
+        '''
+        number = self._validate_countless_number(number)
+        seeks = await sync_to_async(self._get_countless_seeks)(number)
+        wkeys = await self._afetch_keys(seeks)
+        if not wkeys and await sync_to_async(self._fallback_to_primary)():
+            seeks = await sync_to_async(self._get_countless_seeks)(number)
+            wkeys = await self._afetch_keys(seeks)
+        return await sync_to_async(self._finish_countless_page)(number, wkeys)
+
+    async def _acompute_count(self):
+        queryset = self._using_replica(self.object_list)
+        if self.count_strategy != COUNT_EXACT:
+            estimate = await sync_to_async(estimate_count)(queryset)
+            if estimate is not None and (
+                self.count_strategy == COUNT_ESTIMATE or estimate >= self.count_threshold
+                ):
+                return estimate, True
+        return await queryset.order_by().acount(), False
+
+    async def acount(self):
+        '''count的异步版本
+        '''
+        if self._count is None:
+            shared = await sync_to_async(self._get_shared)()
+            if shared['count'] is None:
+                if self.count_cache:
+                    shared['count'], shared['approximate'], self.stats['count_source'] = \
+                        await sync_to_async(self._lookup_count)()
+                else:
+                    shared['count'], shared['approximate'] = await self._acompute_count()
+                    self.stats['count_source'] = 'estimate' if shared['approximate'] else 'exact'
+            else:
+                self.stats['count_source'] = 'cache'
+            self._count = shared['count']
+            if self._count_time is None:
+                self._count_time = time.time()
+            self.count_approximate = shared['approximate']
+        return self._count
+
+    async def _afetch_keys(self, seeks):
+        '''异步执行定位查询，返回按正向排序的排序键值列表
+        '''
+        names = [key[0] for key in self._ordering]
+        wkeys = []
+        for mqset, reverse in seeks:
+            xkeys = [item async for item in mqset.values_list(*names)]
+            if reverse:
+                xkeys.reverse()
+            wkeys.extend(xkeys)
+        return wkeys
+
+    def _can_seek_concurrently(self, number):
+        '''记录总数未确定时，返回本页能否不依赖记录总数，从附近的参考记录、页边界或开始位置正向定位
+        '''
+        self._get_ordering()
+        bottom = (number - 1) * self.per_page
+        self._add_boundary(bottom)
+        nearest = 0
+        for anchor in self._anchors + self._get_shared()['anchors']:
+            if nearest < anchor[0] <= bottom:
+                nearest = anchor[0]
+        return bottom - nearest <= CONCURRENT_SEEK_PAGES * self.per_page
+
+    async def _apage_concurrent(self, number):
+        '''记录总数未确定时，计数查询在独立的数据库连接中与定位查询并发执行
+        定位查询不依赖记录总数，从不超过本页起始位置的最近参考记录或开始位置正向定位，并多取orphans条记录
+        '''
+        a_order, b_order = self._get_ordering()
+        bottom = (number - 1) * self.per_page
+        seeks = self._get_forward_seeks(bottom, bottom + self.per_page + self.orphans, a_order)
+        replica = self._replica_active
+        count_result, wkeys = await asyncio.gather(
+            run_in_own_connection(self._lookup_count)(),
+            self._afetch_keys(seeks)
+        )
+        self._set_count(*count_result)
+        number = await sync_to_async(self._validate_page_number)(number)
+        if replica and not self._replica_active:
+            # 定位结果来自只读副本，改为在主库重新分页
+            return await self.apage(number)
+        bottom, top = self._get_page_range(number)
+        ids, first = await sync_to_async(self._split_keys)(number, bottom, top, bottom, wkeys)
+        return await self._afinish_page(number, bottom, top, a_order, ids, first)
+
+    async def _afinish_page(self, number, bottom, top, a_order, ids, first, rset=None):
+        this_page = await sync_to_async(self._finish_page)(number, bottom, top, a_order, ids, first, rset)
+        if this_page is None:
+            # 记录总数偏大，超出实际记录范围，改用精确计数
+            await sync_to_async(self._reset_count)(await self._using_replica(self.object_list).order_by().acount())
+            return await self.apage(min(number, self.num_pages))
+        return this_page
+
+    async def apage(self, number):
+        '''page()的异步版本，使用Django异步ORM，不阻塞事件循环
+        记录总数未确定、concurrent_count为True、不使用预取并且本页附近有参考记录或页边界时，计数查询与定位查询并发执行；
+        否则与page()相同，先确定记录总数再选择从开始位置、结束位置或参考记录定位
+        '''
+        shared = await sync_to_async(self._get_shared)()
+        if self._count is None and shared['count'] is None and self.concurrent_count and not self.prefetch_cache:
+            try:
+                xnumber = int(number)
+            except (TypeError, ValueError):
+                xnumber = 0
+            if xnumber >= 1 and (xnumber == number or str(xnumber) == number):
+                if await sync_to_async(self._can_seek_concurrently)(xnumber):
+                    return await self._apage_concurrent(xnumber)
+
+        await self.acount()
+        number = await sync_to_async(self._validate_page_number)(number)
+        bottom, top = self._get_page_range(number)
+        a_order, b_order = self._get_ordering()
+
+        rset = None
+        entry = await sync_to_async(self._get_prefetched)(number)
+        if entry is None:
+            await sync_to_async(self._add_boundary)(bottom)
+            await sync_to_async(self._add_histogram_anchor)(bottom, top)
+            await self.alocate_pages(self._get_locate_numbers(bottom, top, number))
+        if entry is not None:
+            ids, first = entry
+            rows = await sync_to_async(self._read_ahead)(number, bottom, top, a_order, first)
+            if rows is not None:
+                rset = rows
+                ids = [item.pk for item in rows]
+                first = self.get_record_key(rows[0]) if rows else None
+        elif self.fetch_mode == FETCH_SUBQUERY and not self.prefetch_cache:
+            rset = self._get_subquery_rset(self._get_seeks(bottom, top, a_order, b_order), a_order)
+            rows = [item async for item in rset]
+            ids = [item.pk for item in rows]
+            first = await sync_to_async(self.get_record_key)(rows[0]) if rows else None
+        else:
+            wbottom, wtop = self._get_window(bottom, top)
+            wkeys = await self._afetch_keys(self._get_seeks(wbottom, wtop, a_order, b_order))
+            ids, first = await sync_to_async(self._split_keys)(number, bottom, top, wbottom, wkeys)
+        return await self._afinish_page(number, bottom, top, a_order, ids, first, rset)
+
 
 class HugePagination(pagination.PageNumberPagination):
     """超大数据表分页类    
@@ -353,12 +1467,54 @@ class HugePagination(pagination.PageNumberPagination):
     django_paginator_class = HugePaginator
     # 携带查询缓存ID的参数名
     query_id_param = 'query_id'  
+    # 查询ID有效期(秒)，None不限制
+    query_id_max_age = 86400
     # 携带分页尺寸的参数名
     page_size_query_param = 'page_size'
     # 允许的最大分页尺寸
     max_page_size = 500
     # 默认分页尺寸
     page_size = 30
+    # 查询ID中保存的参考记录最大数量
+    max_anchors = 10
+    # 参考记录共享缓存，None不使用，True使用进程内LRU缓存，字符串为Django缓存配置名称，也可以是缓存实例
+    anchor_cache = None
+    # 记录总数计算方式，exact精确计数，estimate估算，hybrid估算记录数超过count_threshold时使用估算值
+    count_strategy = COUNT_EXACT
+    count_threshold = 100000
+    # 本页记录读取方式，ids先查询主键再读取记录，subquery以子查询一次读取记录并保留原QuerySet的注解和关联查询
+    fetch_mode = FETCH_IDS
+    # 预取当前页前后相邻页的数量，0不预取
+    prefetch_pages = 0
+    # 预取页缓存，True使用进程内短期缓存，字符串为Django缓存配置名称，也可以是缓存实例
+    prefetch_cache = True
+    # 分页方式，page页码分页，keyset键集分页，countless不计算记录总数的页码分页
+    mode = MODE_PAGE
+    # 键集分页携带游标的参数名
+    cursor_query_param = 'cursor'
+    # 异步分页时计数查询是否与定位查询并发执行
+    concurrent_count = True
+    # 没有参考记录时以窗口函数一次定位的页边界数量，0不使用
+    locator_pages = 0
+    # 是否使用页边界索引，需要将hugepagination加入INSTALLED_APPS并登记(模型, 排序方式)
+    page_boundaries = False
+    # 记录总数缓存，None不使用，True使用进程内缓存，字符串为Django缓存配置名称，也可以是CountCache实例
+    count_cache = None
+    # 查询ID中记录总数和参考记录的最长使用时间(秒)，None不限制
+    count_max_age = 300
+    # 记录查询涉及模型版本号的缓存，模型数据改变后查询ID中的记录总数和参考记录失效，
+    # None时anchor_cache为Django缓存则使用anchor_cache，否则不记录版本号，False不使用，
+    # 字符串为Django缓存配置名称，也可以是缓存实例；True使用进程内缓存，只适用于单进程部署
+    version_cache = None
+    # 排序键直方图，没有参考记录时估计目标页附近的排序键值，None不使用，True使用进程内缓存，
+    # 字符串为Django缓存配置名称，也可以是HistogramCache实例
+    histogram_cache = None
+    # 只读副本的数据库别名，计数、定位和建立参考记录的查询在只读副本执行，本页记录仍按数据库路由读取，None不使用
+    replica = None
+    # 只读副本上得到的页不满或为空时，是否改为在主库重新分页
+    replica_fallback = True
+    # 返回分页执行情况的调试响应头名称，例如'X-Hugepagination'，None不返回
+    debug_header = None
 
     def renew_url(self, urlparts, request, view):
         original_uri_map = getattr(view, 'original_uri_map', None) or getattr(settings, 'ORIGINAL_URI_MAP', None)
@@ -389,30 +1545,136 @@ class HugePagination(pagination.PageNumberPagination):
         urlparts = self.renew_url(urlparts, self.request, self.view)
         return urlunparse(urlparts)
 
+    def _cursor_url(self, cursor):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        url = remove_query_param(url, self.query_id_param)
+        url = replace_query_param(url, self.cursor_query_param, cursor)
+        urlparts = self.renew_url(list(urlparse(url)), self.request, self.view)
+        return urlunparse(urlparts)
+
     def get_next_link(self):
+        if self.mode == MODE_KEYSET:
+            return self._cursor_url(self.next_cursor) if self.next_cursor else None
         url = super().get_next_link()
         if url:
             return self._perfect_url(url)
         return url
 
     def get_previous_link(self):
+        if self.mode == MODE_KEYSET:
+            return self._cursor_url(self.previous_cursor) if self.previous_cursor else None
         url = super().get_previous_link()
         if url:
             return self._perfect_url(url)
         return url
 
+    def get_paginator(self, queryset, page_size, request, view=None):
+        query_id = request.query_params.get(self.query_id_param, None)
+        return self.django_paginator_class(
+            queryset, 
+            page_size, query_id=query_id, 
+            serializer_class=view.get_serializer_class() if view else None,
+            max_anchors=self.max_anchors,
+            anchor_cache=get_anchor_cache(self.anchor_cache),
+            count_strategy=self.count_strategy,
+            count_threshold=self.count_threshold,
+            fetch_mode=self.fetch_mode,
+            prefetch_pages=self.prefetch_pages,
+            prefetch_cache=get_prefetch_cache(self.prefetch_cache),
+            query_id_max_age=self.query_id_max_age,
+            concurrent_count=self.concurrent_count,
+            locator_pages=self.locator_pages,
+            page_boundaries=self.page_boundaries,
+            count_cache=get_count_cache(self.count_cache),
+            count_max_age=self.count_max_age,
+            # False不记录版本号，None由分页器决定是否使用anchor_cache
+            version_cache=self.version_cache and get_anchor_cache(self.version_cache),
+            histogram_cache=get_histogram_cache(self.histogram_cache),
+            replica=self.replica,
+            replica_fallback=self.replica_fallback
+            )
+
+    def _get_position(self, paginator, request):
+        '''从请求的游标参数取得键集分页位置，返回(是否反向, 参考记录排序键值)，没有游标时返回None
+        '''
+        cursor = request.query_params.get(self.cursor_query_param, None)
+        if cursor:
+            return paginator.decode_cursor(cursor)
+        return None
+
+    def paginate_keyset(self, paginator, page_size, request, view=None):
+        '''键集分页，以游标中的参考记录定位，翻页代价与页的深度无关
+        '''
+        position = self._get_position(paginator, request)
+        reverse = position[0] if position else False
+        key = position[1] if position else None
+        # 多取一条记录判断是否还有下一页
+        rows = paginator.seek(key, reverse, page_size + 1)
+        return self._set_keyset(paginator, page_size, request, view, position, rows)
+
+    async def apaginate_keyset(self, paginator, page_size, request, view=None):
+        '''paginate_keyset()的异步版本
+        '''
+        position = await sync_to_async(self._get_position)(paginator, request)
+        reverse = position[0] if position else False
+        key = position[1] if position else None
+        rows = await paginator.aseek(key, reverse, page_size + 1)
+        # 排序键含关联字段时读取排序键值会查询数据库，不能在事件循环中执行
+        return await sync_to_async(self._set_keyset)(paginator, page_size, request, view, position, rows)
+
+    def _set_keyset(self, paginator, page_size, request, view, position, rows):
+        '''根据多取一条的定位结果设置前后页游标，返回本页记录
+        '''
+        reverse = position[0] if position else False
+        key = position[1] if position else None
+        more = len(rows) > page_size
+        if reverse:
+            rows = rows[-page_size:]
+        else:
+            rows = rows[:page_size]
+
+        has_next = more if not reverse else True
+        has_previous = more if reverse else position is not None
+        self.next_cursor = None
+        self.previous_cursor = None
+        if has_next:
+            last = paginator.get_record_key(rows[-1]) if rows else key
+            self.next_cursor = paginator.encode_cursor(False, last)
+        if has_previous:
+            first = paginator.get_record_key(rows[0]) if rows else key
+            self.previous_cursor = paginator.encode_cursor(True, first)
+
+        self.page = None
+        self.view = view
+        self.request = request
+        return rows
+
+    def _send_stats(self, paginator, request, view, queries=None, db_time=None):
+        '''发送page_served信号，报告本次分页的执行情况
+        '''
+        self.stats = dict(paginator.stats, queries=queries, db_time=db_time)
+        page_served.send(sender=self.__class__, paginator=paginator, stats=self.stats, request=request, view=view)
+
     def paginate_queryset(self, queryset, request, view=None):
         page_size = self.get_page_size(request)
         if not page_size:
             return None
 
-        query_id = request.query_params.get(self.query_id_param, None)
+        with QueryStats(connections[queryset.db], connections[self.replica or queryset.db]) as query_stats:
+            paginator = self.get_paginator(queryset, page_size, request, view)
+            if self.mode == MODE_KEYSET:
+                rows = self.paginate_keyset(paginator, page_size, request, view)
+            elif self.mode == MODE_COUNTLESS:
+                rows = self.paginate_countless(paginator, request, view)
+            else:
+                rows = self.paginate_page(paginator, request, view)
+        self._send_stats(paginator, request, view, query_stats.queries, query_stats.db_time)
+        return rows
 
-        paginator = self.django_paginator_class(
-            queryset, 
-            page_size, query_id=query_id, 
-            serializer_class=view.get_serializer_class() if view else None
-            )
+    def paginate_page(self, paginator, request, view=None):
+        '''页码分页，返回本页记录
+        '''
         page_number = request.query_params.get(self.page_query_param, 1)
         if page_number in self.last_page_strings:
             page_number = paginator.num_pages
@@ -420,53 +1682,153 @@ class HugePagination(pagination.PageNumberPagination):
         try:
             self.page = paginator.page(page_number)
         except InvalidPage as exc:
-            msg = self.invalid_page_message.format(
-                page_number=page_number, message=str(exc)
-            )
-            raise NotFound(msg)
+            self._raise_invalid_page(page_number, exc)
 
-        if paginator.num_pages > 1 and self.template is not None:
+        self._set_page(paginator, request, view)
+        return list(self.page)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        '''paginate_queryset()的异步版本，用于异步视图，数据库查询不阻塞事件循环
+        '''
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = await sync_to_async(self.get_paginator)(queryset, page_size, request, view)
+        if self.mode == MODE_KEYSET:
+            rows = await self.apaginate_keyset(paginator, page_size, request, view)
+        elif self.mode == MODE_COUNTLESS:
+            rows = await self.apaginate_countless(paginator, request, view)
+        else:
+            rows = await self.apaginate_page(paginator, request, view)
+        # 异步查询在其他线程执行，不统计查询次数和耗时
+        self._send_stats(paginator, request, view)
+        return rows
+
+    async def apaginate_page(self, paginator, request, view=None):
+        '''paginate_page()的异步版本
+        '''
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings:
+            await paginator.acount()
+            page_number = paginator.num_pages
+
+        try:
+            self.page = await paginator.apage(page_number)
+        except InvalidPage as exc:
+            self._raise_invalid_page(page_number, exc)
+
+        self._set_page(paginator, request, view)
+        return [item async for item in self.page.object_list]
+
+    def paginate_countless(self, paginator, request, view=None):
+        '''不计算记录总数的页码分页，返回本页记录
+        '''
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            self.page = paginator.page_countless(page_number)
+        except InvalidPage as exc:
+            self._raise_invalid_page(page_number, exc)
+
+        self._set_page(paginator, request, view)
+        return list(self.page)
+
+    async def apaginate_countless(self, paginator, request, view=None):
+        '''paginate_countless()的异步版本
+        '''
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            self.page = await paginator.apage_countless(page_number)
+        except InvalidPage as exc:
+            self._raise_invalid_page(page_number, exc)
+
+        self._set_page(paginator, request, view)
+        return [item async for item in self.page.object_list]
+
+    def _raise_invalid_page(self, page_number, exc):
+        msg = self.invalid_page_message.format(
+            page_number=page_number, message=str(exc)
+        )
+        raise NotFound(msg)
+
+    def _set_page(self, paginator, request, view):
+        # 不计算记录总数时不能显示页码导航
+        if self.mode != MODE_COUNTLESS and paginator.num_pages > 1 and self.template is not None:
             # The browsable API should display pagination controls.
             self.display_page_controls = True
 
         self.view = view
         self.request = request
-        return list(self.page)
 
     def get_paginated_response(self, data):
+        response = self.get_paginated_data_response(data)
+        stats = getattr(self, 'stats', None)
+        if self.debug_header and stats:
+            response[self.debug_header] = format_stats(stats)
+        return response
+
+    def get_paginated_data_response(self, data):
+        if self.mode == MODE_KEYSET:
+            return Response({
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'page_size': self.get_page_size(self.request),
+                'results': data
+            })
+        if self.mode == MODE_COUNTLESS:
+            return Response({
+                'query_id': self.page.query_id,
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'page': self.page.number,
+                'page_size': self.get_page_size(self.request),
+                'results': data
+            })
         return Response({
             'query_id': self.page.query_id,
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'count': self.page.paginator.count,
+            'count_approximate': self.page.paginator.count_approximate,
             'page_count': self.page.paginator.num_pages,
             'page': self.page.number,
             'page_size': self.get_page_size(self.request),
             'results': data
         })
 
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        if self.mode in (MODE_KEYSET, MODE_COUNTLESS):
+            # 不计算记录总数
+            schema['required'] = ['results']
+            schema['properties'].pop('count', None)
+        return schema
+
 
 class Turnpage():
     '''记录翻页控制
+    当前记录在首次访问时读取，异步视图使用acurrent()、anext()和aprevious()
+    @batch  是否一次查询取得当前记录及前后记录，排序方式不支持合并查询时逐条查询
     '''
-    def __init__(self, queryset, current=None):
+    def __init__(self, queryset, current=None, batch=True):
         self.queryset = queryset
         self._next = None
         self._previous = None
         self._current = None
-        if current:
-            try:
-                self._current = queryset.get(pk=current)
-            except:
-                pass
+        self._current_pk = current
+        self._loaded = not current
+        self._plan = get_turnpage_plan(queryset) if batch and current else None
+
+    def _set_records(self, records):
+        self._current, self._next, self._previous = split_turnpage_records(
+            records, self._current_pk, self._plan)
 
     @property
     def next(self):        
         if self._next:
             return self._next
 
-        if self.current is None:
-            self._next = None
+        if self.current is None or self._plan:
             return self._next
 
         self._next = get_next_record(self.queryset, self.current)
@@ -478,8 +1840,7 @@ class Turnpage():
         if self._previous:
             return self._previous
 
-        if self.current is None:
-            self._previous = None
+        if self.current is None or self._plan:
             return self._previous
 
         self._previous = get_next_record(self.queryset, self.current, True)
@@ -488,4 +1849,48 @@ class Turnpage():
 
     @property
     def current(self):
-        return self._current
\ No newline at end of file
+        if not self._loaded:
+            self._loaded = True
+            try:
+                if self._plan:
+                    self._set_records(list(get_turnpage_queryset(self.queryset, self._current_pk, self._plan)))
+                else:
+                    self._current = self.queryset.get(pk=self._current_pk)
+            except:
+                pass
+        return self._current
+
+    async def acurrent(self):
+        '''current的异步版本
+        '''
+        if not self._loaded:
+            self._loaded = True
+            try:
+                if self._plan:
+                    qset = get_turnpage_queryset(self.queryset, self._current_pk, self._plan)
+                    self._set_records([item async for item in qset])
+                else:
+                    self._current = await self.queryset.aget(pk=self._current_pk)
+            except:
+                pass
+        return self._current
+
+    async def anext(self):
+        '''next的异步版本
+        '''
+        if self._next:
+            return self._next
+        current = await self.acurrent()
+        if current is not None and not self._plan:
+            self._next = await aget_next_record(self.queryset, current)
+        return self._next
+
+    async def aprevious(self):
+        '''previous的异步版本
+        '''
+        if self._previous:
+            return self._previous
+        current = await self.acurrent()
+        if current is not None and not self._plan:
+            self._previous = await aget_next_record(self.queryset, current, True)
+        return self._previous
@@ -0,0 +1,19 @@
+from django.dispatch import Signal
+
+# 分页类返回一页记录后发送，参数:
+# sender  分页类
+# paginator  分页器实例
+# stats  执行情况字典:
+#     query_id  查询ID状态，none未携带，decoded解码成功，invalid无效或已过期，
+#               stale签名有效但数据已变化或记录总数超过count_max_age，丢弃其中的记录总数和参考记录
+#     count_source  记录总数来源，query_id, cache共享缓存, estimate估算, exact精确计数，未计算时为None
+#     branch  定位方式，start从开始位置，end从结束位置，after_anchor/before_anchor在参考记录之后/之前，
+#             straddle跨越参考记录，prefetch预取缓存，keyset键集分页
+#     offset  定位查询跳过的记录数
+#     anchor  hit使用了参考记录，miss没有可用的参考记录
+#     replica  只读副本状态，replica在只读副本执行，fallback副本数据延迟已改为在主库执行，未配置副本时为None
+#     queries  数据库查询次数，异步分页时为None
+#     db_time  数据库查询耗时(秒)，异步分页时为None
+# request  请求
+# view  视图
+page_served = Signal()
@@ -1,14 +1,19 @@
 from os import path
 from urllib.parse import urlunparse, urlparse 
 from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework.decorators import action
 from rest_framework import status
 from rest_framework.response import Response
+from .export import CONTENT_TYPES, EXPORT_NDJSON, iter_export, iter_parallel_export
 from .pagination import Turnpage
 
 class TurnpageModelMixin():
     '''为视图类`ViewSet`混入翻页功能
     '''
+    # 是否一次查询取得当前记录及前后记录
+    turnpage_batch = True
+
     def get_turnpage_respone(self, turnpage, request, view):
         if not turnpage.current:
             return Response({'detail': '没有数据了'}, status=status.HTTP_404_NOT_FOUND)
@@ -57,7 +62,7 @@ class TurnpageModelMixin():
     @action(detail=True, methods=['get'])
     def next(self, request, pk=None):
         queryset = self.filter_queryset(self.get_queryset())
-        turnpage = Turnpage(queryset, pk)
+        turnpage = Turnpage(queryset, pk, self.turnpage_batch)
         serializer_class = self.get_serializer_class()
         if turnpage.next:
             serializer = serializer_class(turnpage.next)
@@ -67,7 +72,7 @@ class TurnpageModelMixin():
     @action(detail=True, methods=['get'])
     def previous(self, request, pk=None):
         queryset = self.filter_queryset(self.get_queryset())
-        turnpage = Turnpage(queryset, pk)
+        turnpage = Turnpage(queryset, pk, self.turnpage_batch)
         serializer_class = self.get_serializer_class()
         if turnpage.previous:
             serializer = serializer_class(turnpage.previous)
@@ -77,5 +82,59 @@ class TurnpageModelMixin():
     @action(detail=True, methods=['get'])
     def turnpage(self, request, pk=None):
         queryset = self.filter_queryset(self.get_queryset())
-        turnpage = Turnpage(queryset, pk)
-        return self.get_turnpage_respone(turnpage, request, self)
\ No newline at end of file
+        turnpage = Turnpage(queryset, pk, self.turnpage_batch)
+        return self.get_turnpage_respone(turnpage, request, self)
+
+
+class ExportModelMixin():
+    '''为视图类`ViewSet`混入流式导出功能
+    以键集定位逐块读取筛选后的全部记录，使用视图的序列化器逐块序列化，以NDJSON或CSV格式流式返回
+    '''
+    # 导出格式参数名，不能使用DRF保留的format参数
+    export_format_param = 'export_format'
+    # 每块读取的记录数
+    export_chunk_size = 1000
+    # 导出文件名(不含扩展名)
+    export_filename = 'export'
+    # 并行导出的线程或进程数量，0不并行
+    export_workers = 0
+    # 并行导出每段的记录数
+    export_range_size = 10000
+    # 并行导出是否使用进程池
+    export_processes = False
+
+    def get_export_content(self, queryset, export_format):
+        '''返回导出内容生成器
+        '''
+        if self.export_workers:
+            return iter_parallel_export(
+                queryset,
+                self.get_serializer_class(),
+                export_format,
+                context=self.get_serializer_context(),
+                workers=self.export_workers,
+                range_size=self.export_range_size,
+                chunk_size=self.export_chunk_size,
+                processes=self.export_processes
+                )
+        return iter_export(
+            queryset, 
+            self.get_serializer_class(), 
+            export_format, 
+            context=self.get_serializer_context(),
+            chunk_size=self.export_chunk_size
+            )
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        export_format = request.query_params.get(self.export_format_param, EXPORT_NDJSON)
+        if export_format not in CONTENT_TYPES:
+            return Response({'detail': '不支持的导出格式'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            self.get_export_content(queryset, export_format),
+            content_type=CONTENT_TYPES[export_format]
+            )
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (self.export_filename, export_format)
+        return response
@@ -14,15 +14,15 @@ setup(
     author = 'Tang dayong', 
     author_email = "tangdyy@126.com",
     install_requires = [
-        'django>=2.2.0', 
+        'django>=4.1', 
         'djangorestframework>=3.1.0', 
         'django-filter>=2.2.0'
     ],
-    packages = find_packages(),
+    packages = find_packages(exclude=['benchmark', 'benchmark.*', 'tests', 'tests.*']),
     classifiers = [
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires = '>=3.6' 
+    python_requires = '>=3.8' 
 )
\ No newline at end of file
@@ -0,0 +1,28 @@
+import os
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+django.setup()
+
+import pytest
+from django.core.management import call_command
+from django.core.cache import cache
+from .models import Item
+
+
+call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+@pytest.fixture
+def items():
+    '''清空并生成测试记录，返回生成函数
+    '''
+    def seed(count):
+        Item.objects.all().delete()
+        Item.objects.bulk_create([
+            Item(name='n%03d' % (i % 97), status=i % 5, score=None if i % 17 == 0 else i % 251)
+            for i in range(count)
+        ])
+        return Item.objects.all()
+    cache.clear()
+    return seed
@@ -0,0 +1,9 @@
+from django.db import models
+
+
+class Item(models.Model):
+    '''测试用模型
+    '''
+    name = models.CharField(max_length=50, db_index=True)
+    status = models.IntegerField(db_index=True)
+    score = models.DecimalField(max_digits=10, decimal_places=3, null=True)
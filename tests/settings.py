@@ -0,0 +1,20 @@
+# 测试项目配置
+import os
+import tempfile
+
+SECRET_KEY = 'hugepagination-tests'
+INSTALLED_APPS = ['hugepagination', 'tests']
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        # 异步分页在其他线程和独立连接中查询，不能使用内存数据库
+        'NAME': os.path.join(tempfile.mkdtemp(), 'hugepagination-tests.sqlite3'),
+    }
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+USE_TZ = False
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -0,0 +1,106 @@
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from hugepagination import boundary, codec
+from hugepagination.models import PageBoundary
+from hugepagination.pagination import get_seek_condition
+from .models import Item
+
+
+@pytest.fixture(params=[('status', 'name'), ('-score',)])
+def registration(request, items):
+    items(600)
+    registration = boundary.register(Item, request.param, interval=50)
+    registration.rebuild()
+    yield registration
+    boundary._registry.pop(registration.key, None)
+    boundary._model_registry.pop(Item, None)
+    registration.get_boundaries().delete()
+
+
+def check_offsets(registration):
+    '''每个页边界的偏移量等于排序在其排序键值之前的记录数
+    '''
+    items = list(registration.get_boundaries().order_by('offset', 'id'))
+    assert items
+    queryset = registration.get_queryset()
+    for item in items:
+        values = boundary.load_values(item)
+        before = queryset.filter(get_seek_condition(registration.keys, values, False)).count()
+        assert before == item.offset
+    total = queryset.count()
+    # 最后一个页边界之后不足interval条记录
+    assert total - items[-1].offset <= registration.interval
+
+
+def test_insert(registration):
+    Item.objects.create(name='n050', status=2, score=100)
+    Item.objects.create(name='a', status=0, score=None)
+    check_offsets(registration)
+    # 在末尾新增记录时追加页边界，见check_offsets
+    for i in range(60):
+        Item.objects.create(name='z', status=9, score=None)
+    check_offsets(registration)
+
+
+def test_delete(registration):
+    for item in Item.objects.filter(status=3)[:20]:
+        item.delete()
+    Item.objects.order_by('-pk').first().delete()
+    check_offsets(registration)
+
+
+def test_update(registration):
+    for pk in Item.objects.order_by('pk').values_list('pk', flat=True)[:30:3]:
+        item = Item.objects.get(pk=pk)
+        item.status = 4 - item.status
+        item.name = 'm'
+        item.score = None if item.score is not None else 7
+        item.save()
+    check_offsets(registration)
+    # update_fields不包括排序字段时不读取排序键值
+    item = Item.objects.first()
+    fields = [name for name in ('score', 'status') if name not in registration.names]
+    with CaptureQueriesContext(connection) as ctx:
+        item.save(update_fields=fields)
+    assert len(ctx.captured_queries) == 1
+    check_offsets(registration)
+
+
+def test_deferred_until_commit(registration):
+    table = PageBoundary._meta.db_table
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as ctx:
+            Item.objects.create(name='a', status=0, score=0)
+            item = Item.objects.last()
+            item.status = 0
+            item.save()
+            item.delete()
+        assert not any(table in query['sql'] for query in ctx.captured_queries)
+    check_offsets(registration)
+    # 事务回滚时不维护页边界
+    before = list(registration.get_boundaries().values_list('offset', flat=True))
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            Item.objects.create(name='a', status=0, score=0)
+            raise ValueError
+    assert list(registration.get_boundaries().values_list('offset', flat=True)) == before
+    check_offsets(registration)
+
+
+def test_legacy_values(registration):
+    item = registration.get_boundaries().order_by('offset').first()
+    values = boundary.load_values(item)
+    item.values = codec.dumps(values, salt=boundary.SALT)
+    item.save()
+    assert boundary.load_values(item) == values
+    item.values = item.values[:-3]
+    assert boundary.load_values(item) is None
+
+
+def test_rebuild_between_writes(registration):
+    Item.objects.create(name='n050', status=2, score=100)
+    registration.rebuild()
+    Item.objects.create(name='n051', status=2, score=101)
+    Item.objects.order_by('pk').first().delete()
+    check_offsets(registration)
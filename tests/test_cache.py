@@ -0,0 +1,50 @@
+import threading
+from django.db import connection
+from hugepagination.cache import BackgroundTasks, CountCache, HistogramCache, LocalAnchorCache
+from hugepagination.pagination import HugePaginator
+from .models import Item
+
+
+def test_background_tasks_single_thread():
+    tasks = BackgroundTasks()
+    release = threading.Event()
+    done = threading.Event()
+
+    def func():
+        release.wait(5)
+        done.set()
+
+    assert tasks.start('a', func)
+    assert not tasks.start('a', func)
+    assert tasks.start('b', lambda: None)
+    release.set()
+    assert done.wait(5)
+    assert tasks.started == 2
+
+
+def test_count_cache_refresh(items):
+    items(100)
+    cache = CountCache(LocalAnchorCache(prefix='hugepagination:count'), timeout=-1)
+    qs = Item.objects.all()
+    assert cache.get_count(qs, lambda: (100, False)) == (100, False, False)
+    assert cache.get_count(qs, lambda: (101, False)) == (100, False, True)
+    assert cache.refreshes == 1
+
+
+def test_histogram_bulk_change(items):
+    items(3000)
+    qs = Item.objects.order_by('name', 'pk')
+    pks = list(qs.values_list('pk', flat=True))
+    cache = HistogramCache(buckets=20, sample_size=300, background=False)
+    paginator = HugePaginator(qs, 30, histogram_cache=cache)
+    assert [obj.pk for obj in paginator.page(40).object_list] == pks[1170:1200]
+    assert paginator.stats['branch'] != 'start'
+    key = cache.make_key(qs, paginator._get_fingerprint())
+    assert cache.storage.get(key)['count'] == 3000
+    # 批量删除不发送信号，精确计数的记录总数改变后直方图重新建立
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE id <= %%s' % Item._meta.db_table, [sorted(pks)[299]])
+    pks = list(qs.values_list('pk', flat=True))
+    paginator = HugePaginator(qs, 30, histogram_cache=cache)
+    assert [obj.pk for obj in paginator.page(40).object_list] == pks[1170:1200]
+    assert cache.storage.get(key)['count'] == 2700
@@ -0,0 +1,71 @@
+import base64
+import datetime
+import decimal
+import uuid
+import pytest
+from hugepagination import codec
+
+
+VALUES = [
+    None, True, False, 0, -1, 2 ** 70, 1.5, '', 'abc', b'\x00\xff',
+    decimal.Decimal('1234567890123456789012345678901234.56789'),
+    decimal.Decimal('-0.000000000000000000000000000000001'),
+    decimal.Decimal('12.500'),
+    decimal.Decimal('1E+40'),
+    datetime.datetime(2024, 1, 2, 3, 4, 5, 6),
+    datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=8))),
+    datetime.date(2024, 1, 2), datetime.time(23, 59, 59, 999999),
+    datetime.timedelta(days=-1, seconds=5), uuid.UUID(int=12345),
+    [1, 'a', [None, decimal.Decimal('0.1')]],
+]
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_round_trip(value):
+    for result in (codec.loads(codec.dumps(value)), codec.unpack(codec.pack(value))):
+        assert result == value
+        assert type(result) is type(value)
+        assert str(result) == str(value)
+
+
+def test_long_decimal_exact():
+    value = decimal.Decimal('1234567890123456789012345678901234.56789')
+    assert codec.loads(codec.dumps([value]))[0].as_tuple() == value.as_tuple()
+
+
+def test_tuple_as_list():
+    assert codec.loads(codec.dumps((1, 2))) == [1, 2]
+
+
+def test_tampered_token():
+    token = codec.dumps([10, 'x'])
+    data = bytearray(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    data[3] ^= 1
+    tampered = base64.urlsafe_b64encode(bytes(data)).rstrip(b'=').decode()
+    with pytest.raises(codec.BadToken):
+        codec.loads(tampered)
+
+
+def test_wrong_salt():
+    with pytest.raises(codec.BadToken):
+        codec.loads(codec.dumps(1, salt='a'), salt='b')
+
+
+@pytest.mark.parametrize('token', ['', '!!!', 'AAAA', codec.dumps(1)[:-2]])
+def test_malformed_token(token):
+    with pytest.raises(codec.BadToken):
+        codec.loads(token)
+
+
+def test_expired_token():
+    token = codec.dumps(1)
+    assert codec.loads(token, max_age=60) == 1
+    with pytest.raises(codec.BadToken):
+        codec.loads(token, max_age=-1)
+
+
+def test_unpack_bad_data():
+    with pytest.raises(codec.BadToken):
+        codec.unpack(codec.pack([1, 2])[:-2])
+    with pytest.raises(codec.BadToken):
+        codec.unpack('')
@@ -0,0 +1,125 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from hugepagination.cache import DjangoAnchorCache, LocalAnchorCache
+from hugepagination.pagination import HugePaginator
+from .models import Item
+
+
+def page_pks(page):
+    return [obj.pk for obj in page.object_list]
+
+
+def test_query_id_other_queryset(items):
+    items(2000)
+    qs_a = Item.objects.order_by('name', 'pk')
+    qs_b = Item.objects.filter(status=1).order_by('name', 'pk')
+    query_id = HugePaginator(qs_a, 30).page(40).query_id
+    paginator = HugePaginator(qs_b, 30, query_id=query_id)
+    page = paginator.page(10)
+    assert paginator.stats['query_id'] == 'stale'
+    assert paginator.count == qs_b.count()
+    assert page_pks(page) == list(qs_b.values_list('pk', flat=True)[270:300])
+
+
+def test_query_id_same_queryset(items):
+    items(2000)
+    qs = Item.objects.order_by('name', 'pk')
+    query_id = HugePaginator(qs, 30).page(40).query_id
+    paginator = HugePaginator(qs, 30, query_id=query_id)
+    page = paginator.page(41)
+    assert paginator.stats['query_id'] == 'decoded'
+    assert paginator.stats['count_source'] == 'query_id'
+    assert page_pks(page) == list(qs.values_list('pk', flat=True)[1200:1230])
+
+
+def test_version_cache_shared_only(items):
+    items(100)
+    qs = Item.objects.order_by('name', 'pk')
+    assert HugePaginator(qs, 30, anchor_cache=LocalAnchorCache()).version_cache is None
+    shared = DjangoAnchorCache('default')
+    assert HugePaginator(qs, 30, anchor_cache=shared).version_cache is shared
+    assert HugePaginator(qs, 30, anchor_cache=shared, version_cache=False).version_cache is None
+
+
+def test_query_id_stale_after_write(items):
+    items(2000)
+    qs = Item.objects.order_by('name', 'pk')
+    cache = DjangoAnchorCache('default')
+    query_id = HugePaginator(qs, 30, anchor_cache=cache).page(40).query_id
+    Item.objects.create(name='a', status=0)
+    paginator = HugePaginator(qs, 30, query_id=query_id, anchor_cache=cache)
+    page = paginator.page(40)
+    assert paginator.stats['query_id'] == 'stale'
+    assert page_pks(page) == list(qs.values_list('pk', flat=True)[1170:1200])
+
+
+def test_prefetch_sequential(items):
+    items(2000)
+    qs = Item.objects.order_by('name', 'pk')
+    pks = list(qs.values_list('pk', flat=True))
+    cache = LocalAnchorCache(timeout=30, prefix='hugepagination:prefetch')
+    query_id = None
+    for number in range(1, 12):
+        paginator = HugePaginator(qs, 30, query_id=query_id, prefetch_pages=1, prefetch_cache=cache)
+        with CaptureQueriesContext(connection) as ctx:
+            page = paginator.page(number)
+            assert page_pks(page) == pks[(number - 1) * 30:number * 30]
+        if number > 2:
+            assert len(ctx.captured_queries) <= 1
+            assert paginator.prefetch_hit
+        query_id = page.query_id
+
+
+def test_prefetch_client_space(items):
+    items(2000)
+    qs = Item.objects.order_by('name', 'pk')
+    pks = list(qs.values_list('pk', flat=True))
+    cache = LocalAnchorCache(timeout=30, prefix='hugepagination:prefetch')
+    query_id = HugePaginator(qs, 30).page(40).query_id
+    # 由客户端参考记录定位得到的相邻页只能由携带查询ID的后续请求读取
+    paginator = HugePaginator(qs, 30, query_id=query_id, prefetch_pages=1, prefetch_cache=cache)
+    query_id = paginator.page(41).query_id
+    assert paginator._client_derived
+    paginator = HugePaginator(qs, 30, prefetch_pages=1, prefetch_cache=cache)
+    paginator.page(42)
+    assert not paginator.prefetch_hit
+    for number in range(42, 46):
+        paginator = HugePaginator(qs, 30, query_id=query_id, prefetch_pages=1, prefetch_cache=cache)
+        with CaptureQueriesContext(connection) as ctx:
+            page = paginator.page(number)
+            assert page_pks(page) == pks[(number - 1) * 30:number * 30]
+        assert paginator.prefetch_hit and len(ctx.captured_queries) <= 1
+        query_id = page.query_id
+
+
+def test_apage_deep_page(items):
+    items(2000)
+    qs = Item.objects.order_by('name', 'pk')
+    pks = list(qs.values_list('pk', flat=True))
+
+    async def get_page(paginator, number):
+        page = await paginator.apage(number)
+        return await sync_to_async(page_pks)(page)
+
+    # 附近没有参考记录的深层页先确定记录总数，从结束位置定位
+    paginator = HugePaginator(qs, 30)
+    assert asyncio.run(get_page(paginator, 60)) == pks[1770:1800]
+    assert paginator.stats['branch'] == 'end'
+    paginator = HugePaginator(qs, 30)
+    assert asyncio.run(get_page(paginator, 3)) == pks[60:90]
+    assert paginator.stats['branch'] == 'start' and paginator.count == 2000
+
+
+def test_pagination_plan_shared(items):
+    items(100)
+    first = HugePaginator(Item.objects.order_by('name'), 30)
+    first.page(2)
+    second = HugePaginator(Item.objects.filter(status=1).order_by('name'), 30)
+    second.page(1)
+    assert first._plan is second._plan
+    third = HugePaginator(Item.objects.order_by('-name'), 30)
+    third.page(1)
+    assert third._plan is not first._plan
+    assert third._ordering == [['name', False, None], ['pk', False, None]]